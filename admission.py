@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted in time; `retry_after` is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """AIMD concurrency limiter with a bounded, deadline-aware FIFO queue.
+
+    At most `limit` calls run at once. The limit grows by roughly one per
+    round-trip while calls succeed and is halved when the upstream reports
+    overload, so bursts settle at whatever concurrency the quota sustains.
+    Callers beyond the limit wait in line; they are rejected up front when the
+    queue is full or the estimated wait exceeds their budget, and rejected
+    later if their budget runs out while queued.
+    """
+
+    def __init__(self, initial_limit: int = 16, min_limit: int = 1, max_limit: int = 256,
+                 max_queue: int = 500, max_wait: float = 15.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_use = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.avg_latency = 1.0  # seconds, EMA of call durations
+        self.last_decrease = 0.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_deadline": 0,
+                      "timed_out": 0, "decreases": 0}
+
+    def estimated_wait(self, position: int) -> float:
+        return position * self.avg_latency / max(self.limit, 1.0)
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        max_wait = self.max_wait if max_wait is None else max_wait
+
+        if self.in_use < int(self.limit) and not self.waiters:
+            self.in_use += 1
+            self.stats["admitted"] += 1
+            return
+
+        estimate = self.estimated_wait(len(self.waiters) + 1)
+        if len(self.waiters) >= self.max_queue:
+            self.stats["rejected_full"] += 1
+            raise AdmissionRejected("queue full", estimate)
+        if estimate > max_wait:
+            self.stats["rejected_deadline"] += 1
+            raise AdmissionRejected("deadline would be missed", estimate)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait({waiter}, timeout=max_wait)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        if not waiter.done():
+            self._abandon(waiter)
+            self.stats["timed_out"] += 1
+            raise AdmissionRejected("timed out in queue", self.estimated_wait(len(self.waiters) + 1))
+        self.stats["admitted"] += 1
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as we gave up; pass it on
+            self.in_use -= 1
+            self._wake()
+            return
+        waiter.cancel()
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, latency: float, overloaded: bool = False):
+        self.in_use -= 1
+        self.avg_latency = 0.9 * self.avg_latency + 0.1 * latency
+
+        now = time.monotonic()
+        if overloaded:
+            # Back off at most once per round-trip so one burst of 429s doesn't collapse the limit
+            if now - self.last_decrease >= self.avg_latency:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                self.last_decrease = now
+                self.stats["decreases"] += 1
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+        self._wake()
+
+    def _wake(self):
+        while self.waiters and self.in_use < int(self.limit):
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_use += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None, is_overload=lambda e: False):
+        """Hold one admission slot for the duration of the block."""
+        await self.acquire(max_wait)
+        started = time.monotonic()
+        overloaded = False
+        try:
+            yield
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self.release(time.monotonic() - started, overloaded)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_use": self.in_use,
+            "queue_length": len(self.waiters),
+            "avg_latency": round(self.avg_latency, 3),
+            **self.stats,
+        }
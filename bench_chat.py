@@ -0,0 +1,77 @@
+"""Offline load test of the chat endpoints against the fake LLM backend.
+
+With the fake's latency set to zero the numbers are the server's own
+per-request overhead (validation, caches, admission, history handling).
+
+    python bench_chat.py --sessions 200 --turns 5
+    python bench_chat.py --stream --latency-ms 800
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _run(args):
+    import httpx
+    import main
+
+    messages = ["What products do you have?", "I want a demo", "Jane Doe",
+                "jane@example.com 5551234", "We need LinkedIn automation"]
+    latencies = []
+    errors = 0
+
+    async def session(client, index):
+        nonlocal errors
+        for turn in range(args.turns):
+            payload = {"session_id": f"bench-{index}", "message": messages[turn % len(messages)]}
+            started = time.perf_counter()
+            if args.stream:
+                async with client.stream("POST", "/chat/stream", json=payload) as response:
+                    body = await response.aread()
+                    ok = response.status_code == 200 and b"event: done" in body
+            else:
+                response = await client.post("/chat", json=payload)
+                ok = response.status_code == 200
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(session(client, i) for i in range(args.sessions)))
+            elapsed = time.perf_counter() - started
+
+    print(f"{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s), {errors} errors")
+    print(f"latency ms: mean {statistics.mean(latencies) * 1000:.2f}  "
+          f"p50 {_percentile(latencies, 0.5) * 1000:.2f}  "
+          f"p99 {_percentile(latencies, 0.99) * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream instead of /chat")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="median fake model latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of injected 429s")
+    args = parser.parse_args()
+
+    # Configure the fake backend before main.py reads its settings
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_FIRST_TOKEN_MS"] = str(args.latency_ms / 3)
+    os.environ["FAKE_TOKENS_PER_SECOND"] = "1000000" if args.latency_ms == 0 else "50"
+    os.environ["FAKE_ERROR_RATE"] = str(args.error_rate)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Microbenchmark: session history as a list of SDK dicts vs a TurnBuffer ring.
+
+Fills `--sessions` sessions to `--capacity` messages, then runs one more turn
+per session, comparing memory held by the histories (message texts are shared
+and not counted) and the time per turn including trimming.
+
+    python bench_sessions.py --sessions 100000 --capacity 20
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from turns import TurnBuffer
+
+USER_TEXT = "Could you tell me more about CRM Intelligence pricing?"
+MODEL_TEXT = "CRM Intelligence enriches your lead data automatically. Would you like a demo?"
+
+
+def fill_dicts(sessions: int, capacity: int) -> dict:
+    store = {}
+    for i in range(sessions):
+        history = []
+        for _ in range(capacity // 2):
+            history.append({"role": "user", "parts": [USER_TEXT]})
+            history.append({"role": "model", "parts": [MODEL_TEXT]})
+        store[i] = history
+    return store
+
+
+def fill_ring(sessions: int, capacity: int) -> dict:
+    store = {}
+    for i in range(sessions):
+        turns = TurnBuffer(capacity)
+        for _ in range(capacity // 2):
+            turns.append("user", USER_TEXT)
+            turns.append("model", MODEL_TEXT)
+        store[i] = turns
+    return store
+
+
+def turn_dicts(store: dict, capacity: int):
+    # The original scheme: append, then keep the last `capacity` messages by slicing
+    for i in store:
+        store[i].append({"role": "user", "parts": [USER_TEXT]})
+        store[i].append({"role": "model", "parts": [MODEL_TEXT]})
+        store[i] = store[i][-capacity:]
+
+
+def turn_ring(store: dict, capacity: int):
+    for turns in store.values():
+        turns.append("user", USER_TEXT)
+        turns.append("model", MODEL_TEXT)
+
+
+def measure_memory(fill, sessions: int, capacity: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    store = fill(sessions, capacity)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current / sessions
+
+
+def measure_turns(fill, turn, sessions: int, capacity: int, rounds: int) -> float:
+    store = fill(sessions, capacity)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        turn(store, capacity)
+    return (time.perf_counter() - started) / (rounds * sessions)
+
+
+def measure_prompt(store: dict, to_sdk) -> float:
+    started = time.perf_counter()
+    for history in store.values():
+        to_sdk(history)
+    return (time.perf_counter() - started) / len(store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--capacity", type=int, default=20, help="messages kept per session (even)")
+    parser.add_argument("--rounds", type=int, default=3, help="extra turns per session when timing")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions x {args.capacity} messages")
+    for name, fill, turn, to_sdk in (
+        ("list of dicts", fill_dicts, turn_dicts, list),
+        ("TurnBuffer", fill_ring, turn_ring, TurnBuffer.to_sdk),
+    ):
+        per_session = measure_memory(fill, args.sessions, args.capacity)
+        per_turn = measure_turns(fill, turn, args.sessions, args.capacity, args.rounds)
+        per_prompt = measure_prompt(fill(args.sessions, args.capacity), to_sdk)
+        print(f"{name:>14}: {per_session:8.0f} B/session  {per_turn * 1e6:6.2f} us/turn  "
+              f"{per_prompt * 1e6:6.2f} us/prompt history")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import math
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline expired while waiting on `stage`."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# The deadline of the request being handled. Set once when the request arrives;
+# tasks spawned while handling it (retries, single-flight calls) inherit it.
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+exceeded_by_stage: Counter = Counter()
+
+
+def start(seconds: float) -> Deadline:
+    deadline = Deadline(seconds)
+    _current.set(deadline)
+    return deadline
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def budget(cap: float = math.inf) -> float:
+    """Seconds the next outbound call may take: `cap`, shortened to what is left of the deadline."""
+    deadline = current()
+    return cap if deadline is None else min(cap, deadline.remaining())
+
+
+def expires_at() -> Optional[float]:
+    deadline = current()
+    return deadline.expires_at if deadline else None
+
+
+def record_exceeded(stage: str):
+    """Count a deadline expiry during `stage` (e.g. one reported by the transport rather than raised here)."""
+    exceeded_by_stage[stage] += 1
+
+
+def exceeded(stage: str) -> DeadlineExceeded:
+    record_exceeded(stage)
+    return DeadlineExceeded(stage)
+
+
+async def within(stage: str, make_call: Callable[[float], Awaitable[Any]], cap: float = math.inf) -> Any:
+    """Run `make_call(timeout)` bounded by both `cap` and the request deadline.
+
+    The timeout is also handed to the call so it can be passed on to the
+    transport. A timeout caused by the deadline raises DeadlineExceeded; one
+    caused by `cap` alone is re-raised as asyncio.TimeoutError.
+    """
+    timeout = budget(cap)
+    if timeout <= 0:
+        raise exceeded(stage)
+    try:
+        return await asyncio.wait_for(make_call(timeout), timeout)
+    except asyncio.TimeoutError:
+        deadline = current()
+        if deadline is not None and deadline.expired:
+            raise exceeded(stage) from None
+        raise
+
+
+def snapshot() -> dict:
+    return {"exceeded_by_stage": dict(exceeded_by_stage)}
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import random
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+from llm import Completion, LLMBackend
+
+ASK_NAME = "Happy to help with that. May I have your name?"
+ASK_CONTACT = "Thanks! What is your email and phone number?"
+ASK_REQUIREMENT = "Great. Could you share a short message or specific requirement?"
+LEAD_COMPLETE = "[LEAD_COMPLETE] Thank you for submitting your details. Our team will connect with you shortly."
+PRODUCT_REPLY = (
+    "Here are the options:\n"
+    "1. LinkedIn Autopilot: Handles content strategy.\n"
+    "2. CRM Intelligence: Enriches lead data.\n"
+    "3. KnowledgeOS: Answers from your company knowledge.\n"
+    "Which one sounds better?"
+)
+REFUSAL = "I am designed to assist only with Agentica's AI services and products. How can I help you with those?"
+
+_BUYING_INTENT = re.compile(r"\b(price|pricing|cost|demo|meeting|buy|implement\w*)\b", re.IGNORECASE)
+_OFF_TOPIC = re.compile(r"\b(recipe|football|weather|python|joke|poem)\b", re.IGNORECASE)
+
+# Lead flow: what the fake says after each of its own questions
+_NEXT_STEP = {ASK_NAME: ASK_CONTACT, ASK_CONTACT: ASK_REQUIREMENT, ASK_REQUIREMENT: LEAD_COMPLETE}
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic offline backend for load tests and benchmarks.
+
+    Replies follow a fixed script that walks through the lead flow (ending in
+    [LEAD_COMPLETE]) when the user shows buying intent. Latency is drawn from
+    a log-normal distribution around `latency_ms`, streams are emitted at
+    `tokens_per_second`, and `error_rate` / `server_error_rate` inject 429 and
+    503 errors. All randomness comes from one seeded generator.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 800, latency_sigma: float = 0.3, first_token_ms: float = 300,
+                 tokens_per_second: float = 50, chunk_tokens: int = 4, error_rate: float = 0.0,
+                 server_error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.first_token_ms = first_token_ms
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.random = random.Random(seed)
+        self.stats = {"generate": 0, "stream": 0, "injected_429": 0, "injected_503": 0}
+
+    def _delay(self, median_ms: float) -> float:
+        return self.random.lognormvariate(0, self.latency_sigma) * median_ms / 1000
+
+    def _maybe_fail(self):
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.stats["injected_429"] += 1
+            raise api_exceptions.ResourceExhausted("Resource exhausted (injected by FakeBackend)")
+        if roll < self.error_rate + self.server_error_rate:
+            self.stats["injected_503"] += 1
+            raise api_exceptions.ServiceUnavailable("Service unavailable (injected by FakeBackend)")
+
+    def reply_for(self, message: str, history: List[Dict]) -> str:
+        last_model = next((m["parts"][0] for m in reversed(history) if m["role"] == "model"), None)
+        if last_model in _NEXT_STEP:
+            return _NEXT_STEP[last_model]
+        if _OFF_TOPIC.search(message):
+            return REFUSAL
+        if _BUYING_INTENT.search(message):
+            return ASK_NAME
+        return PRODUCT_REPLY
+
+    def _one_off(self, prompt: str, structured: bool) -> str:
+        if structured:
+            return json.dumps({"name": "Fake User", "contact": "fake.user@example.com", "message": "Benchmark lead"})
+        return f"Earlier conversation summarized ({len(prompt)} characters)."
+
+    def _structured_reply(self, text: str) -> str:
+        # Lead fields are left for the caller's local tracker to fill in
+        return json.dumps({
+            "reply": text.replace("[LEAD_COMPLETE]", "").strip(),
+            "lead_complete": "[LEAD_COMPLETE]" in text,
+            "name": None, "contact": None, "message": None,
+        })
+
+    async def generate(self, message: str, *, model: str, history: Optional[List[Dict]] = None,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict] = None) -> Completion:
+        self.stats["generate"] += 1
+        await asyncio.sleep(self._delay(self.latency_ms))
+        self._maybe_fail()
+        structured = response_schema is not None
+        if history is None:
+            text = self._one_off(message, structured)
+        else:
+            text = self.reply_for(message, history)
+            if structured:
+                text = self._structured_reply(text)
+        # No prompt token count: the fake never sees the system instruction, so it
+        # must not feed the token estimator's calibration
+        return Completion(text, total_tokens=len(text) // 4)
+
+    async def stream(self, message: str, *, model: str, history: List[Dict],
+                     timeout: Optional[float] = None) -> AsyncIterator[str]:
+        self.stats["stream"] += 1
+        await asyncio.sleep(self._delay(self.first_token_ms))
+        self._maybe_fail()
+
+        # Roughly one token per four characters, a few tokens per chunk
+        text = self.reply_for(message, history)
+        chunk_chars = 4 * self.chunk_tokens
+        for start in range(0, len(text), chunk_chars):
+            if start:
+                await asyncio.sleep(self.chunk_tokens / self.tokens_per_second)
+            yield text[start:start + chunk_chars]
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, **self.stats}
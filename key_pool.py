@@ -0,0 +1,121 @@
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import client_options as client_options_lib
+
+
+class ApiKey:
+    """Sliding-window usage of one Gemini API key."""
+
+    def __init__(self, index: int, key: str):
+        self.index = index
+        self.key = key
+        self.label = f"key{index}:...{key[-4:]}"
+        self.requests: Deque[float] = deque()
+        self.tokens: Deque[Tuple[float, int]] = deque()
+        self.token_total = 0
+        self.overloads: Deque[float] = deque()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.models: Dict[str, genai.GenerativeModel] = {}
+        self._async_client = None
+
+    def prune(self, now: float, window: float):
+        cutoff = now - window
+        while self.requests and self.requests[0] < cutoff:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] < cutoff:
+            self.token_total -= self.tokens.popleft()[1]
+        while self.overloads and self.overloads[0] < cutoff:
+            self.overloads.popleft()
+
+    @property
+    def async_client(self):
+        # One gRPC client per key; genai.configure() only supports a single global key
+        if self._async_client is None:
+            self._async_client = glm.GenerativeServiceAsyncClient(
+                client_options=client_options_lib.ClientOptions(api_key=self.key)
+            )
+        return self._async_client
+
+
+class ApiKeyPool:
+    """Spreads Gemini calls over several API keys (and therefore several quotas).
+
+    Each call goes to the healthy key with the lowest load, where load is the
+    larger of its RPM and TPM utilisation over the sliding window. A key that returns 429 is cooled down for
+    `cooldown` seconds; if every key is cooling down, the one that recovers
+    first is used.
+    """
+
+    def __init__(self, keys: List[str], rpm_limit: int = 15, tpm_limit: int = 1_000_000,
+                 window: float = 60.0, cooldown: float = 30.0):
+        if not keys:
+            raise ValueError("At least one Gemini API key is required")
+        self.keys = [ApiKey(i, key) for i, key in enumerate(keys)]
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.window = window
+        self.cooldown = cooldown
+
+    @property
+    def primary(self) -> ApiKey:
+        return self.keys[0]
+
+    def _load(self, key: ApiKey) -> float:
+        return max(len(key.requests) / self.rpm_limit, key.token_total / self.tpm_limit)
+
+    def acquire(self) -> ApiKey:
+        now = time.monotonic()
+        for key in self.keys:
+            key.prune(now, self.window)
+
+        healthy = [key for key in self.keys if key.cooldown_until <= now]
+        if healthy:
+            key = min(healthy, key=self._load)
+        else:
+            key = min(self.keys, key=lambda k: k.cooldown_until)
+
+        key.in_flight += 1
+        key.requests.append(now)
+        return key
+
+    def release(self, key: ApiKey, overloaded: bool = False):
+        key.in_flight -= 1
+        if overloaded:
+            now = time.monotonic()
+            key.overloads.append(now)
+            key.cooldown_until = now + self.cooldown
+
+    def record_tokens(self, key: ApiKey, tokens: int):
+        if tokens:
+            key.tokens.append((time.monotonic(), tokens))
+            key.token_total += tokens
+
+    def model(self, key: ApiKey, variant: str, factory: Callable[[], genai.GenerativeModel]) -> genai.GenerativeModel:
+        """Per-key instance of the model `variant`, built by `factory` and bound to the key's client."""
+        model = key.models.get(variant)
+        if model is None:
+            model = factory()
+            # GenerativeModel has no public way to pick a client; it uses this one when set
+            model._async_client = key.async_client
+            key.models[variant] = model
+        return model
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        usage = {}
+        for key in self.keys:
+            key.prune(now, self.window)
+            usage[key.label] = {
+                "rpm": len(key.requests),
+                "tpm": key.token_total,
+                "in_flight": key.in_flight,
+                "recent_429s": len(key.overloads),
+                "cooling_down": key.cooldown_until > now,
+                "load": round(self._load(key), 3),
+            }
+        return {"rpm_limit": self.rpm_limit, "tpm_limit": self.tpm_limit, "keys": usage}
@@ -0,0 +1,250 @@
+import asyncio
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"(?<![\w@])\+?\d[\d\s().-]{5,}\d(?![\w@])")
+# Lead-ins before a name ("Sure, it's John"), matched anywhere in the answer
+_NAME_LEAD_IN = re.compile(r"\b(?:my name is|my name's|name is|name:|i am|i'm|im|this is|it's|it is)\s+", re.IGNORECASE)
+_NAME_GREETING = re.compile(r"^(?:(?:hi|hello|hey|sure|yes|yeah|ok|okay|of course)[,!. ]+)+", re.IGNORECASE)
+# Two digit groups joined by a dash, e.g. "2024-2025" or "10000-20000", are ranges rather than phones
+_NUMBER_RANGE = re.compile(r"^(\d+)\s*[-\u2013]\s*(\d+)$")
+_YEAR = re.compile(r"^(?:19|20)\d\d$")
+_MY_NAME = re.compile(r"\bmy name is\s+([A-Za-z][A-Za-z .'-]{0,60}?)(?=[,.!?\n]|\band\b|$)", re.IGNORECASE)
+
+# Which detail the model is asking for, judged from its reply. Only replies that
+# ask a question move the flow, and contact is checked first because "email and
+# phone" replies often mention the name the user just gave.
+_ASKS = (
+    ("contact", re.compile(r"\b(e-?mail|phone|contact (?:details|number|info))", re.IGNORECASE)),
+    ("requirement", re.compile(r"\b(requirements?|message|looking for|what you need)\b", re.IGNORECASE)),
+    ("name", re.compile(r"\b(your|full) name\b", re.IGNORECASE)),
+)
+
+MAX_NAME_CHARS = 60
+# Outside the contact step, a phone number is only taken from a message made of
+# contact details and these words ("my number is ...", "call me on ...")
+_CONTACT_WORDS = frozenset((
+    "my", "number", "phone", "mobile", "cell", "tel", "whatsapp", "email", "mail", "is", "its", "it's",
+    "and", "or", "call", "me", "reach", "contact", "you", "can", "on", "at", "here", "ok", "sure",
+))
+MAX_NAME_WORDS = 4
+MAX_REQUIREMENT_CHARS = 500
+
+
+def _phone(text: str) -> Optional[str]:
+    for match in PHONE_RE.finditer(text):
+        phone = match.group().strip()
+        digits = sum(c.isdigit() for c in phone)
+        if 7 <= digits <= 15 and not _is_range(phone):
+            return phone
+    return None
+
+
+def _is_range(text: str) -> bool:
+    match = _NUMBER_RANGE.match(text)
+    if not match:
+        return False
+    low, high = match.groups()
+    if _YEAR.match(low) and _YEAR.match(high):
+        return True
+    return len(low) == len(high) and int(low) < int(high)
+
+
+def _contact_only(text: str) -> bool:
+    rest = PHONE_RE.sub(" ", EMAIL_RE.sub(" ", text))
+    return all(word in _CONTACT_WORDS for word in re.findall(r"[^\W\d_]+(?:'[^\W\d_]+)?", rest.lower()))
+
+
+def _name(text: str) -> Optional[str]:
+    """The name in an answer to "what's your name?", or None if it doesn't look like one."""
+    text = text.strip()
+    if "?" in text:
+        # A question back ("why do you need my name?") is not an answer
+        return None
+    lead_in = _NAME_LEAD_IN.search(text)
+    if lead_in:
+        text = text[lead_in.end():]
+    name = _NAME_GREETING.sub("", text).strip(" .,!")
+    if (not name or len(name) > MAX_NAME_CHARS or len(name.split()) > MAX_NAME_WORDS
+            or any(c.isdigit() for c in name) or "@" in name):
+        return None
+    return name
+
+
+@dataclass
+class LeadState:
+    """What has been collected so far in one session's lead flow."""
+
+    step: Optional[str] = None  # detail the model asked for last: name, contact or requirement
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    requirement: Optional[str] = None
+
+    def contact(self) -> Optional[str]:
+        return ", ".join(c for c in (self.email, self.phone) if c) or None
+
+    def as_lead(self) -> Dict:
+        return {"name": self.name, "contact": self.contact(), "message": self.requirement}
+
+    def reset(self):
+        self.step = self.name = self.email = self.phone = self.requirement = None
+
+
+class LeadTracker:
+    """Deterministic lead extraction, updated incrementally on every turn.
+
+    Emails are picked out of any user message with a regex. Phone numbers
+    are taken from the answer to the contact question, or from a message that
+    is essentially just contact details.
+    The name and requirement are taken from the user message that answers the
+    model's question for them, so when [LEAD_COMPLETE] appears the lead is
+    usually already known without another model call. The LeadState itself
+    lives on the session.
+    """
+
+    def __init__(self):
+        self.stats = {"completed": 0, "complete_locally": 0, "incomplete": 0}
+
+    def observe(self, state: LeadState, user_message: str, reply_text: str):
+        """Fold one turn (the user's message and the model's reply) into the session's state."""
+        email = EMAIL_RE.search(user_message)
+        if email:
+            state.email = email.group()
+        # Numbers mentioned in passing (visitor counts, budgets) are not phone numbers
+        if state.step == "contact" or _contact_only(user_message):
+            phone = _phone(EMAIL_RE.sub(" ", user_message))
+            if phone:
+                state.phone = phone
+
+        # Messages answering the model's last question
+        if state.step == "name":
+            state.name = _name(user_message) or state.name
+        elif state.step == "requirement":
+            state.requirement = user_message.strip()[:MAX_REQUIREMENT_CHARS]
+        if not state.name:
+            match = _MY_NAME.search(user_message)
+            if match:
+                state.name = _name(match.group(1))
+
+        state.step = None
+        if "?" in reply_text:
+            for step, pattern in _ASKS:
+                if pattern.search(reply_text):
+                    state.step = step
+                    break
+
+    def complete(self, state: LeadState) -> Dict:
+        """Return the collected lead and reset the session's flow.
+
+        Missing fields are None; callers can fall back to model extraction for them.
+        """
+        lead = state.as_lead()
+        state.reset()
+        self.stats["completed"] += 1
+        if all(lead.values()):
+            self.stats["complete_locally"] += 1
+        else:
+            self.stats["incomplete"] += 1
+        return lead
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+
+# Fills in missing lead fields (or returns None); delivers a finished lead to the sinks
+ExtractFn = Callable[[], Awaitable[Optional[Dict]]]
+DeliverFn = Callable[[str, Dict], Awaitable[None]]
+
+
+@dataclass
+class LeadJob:
+    lead: Dict
+    extract: Optional[ExtractFn] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def pending(self) -> bool:
+        return not self.done.is_set()
+
+
+class LeadDispatcher:
+    """Finishes completed leads in the background, off the chat response path.
+
+    A job fills fields the tracker missed with the model extraction (if any)
+    and then hands the lead to `deliver` (e.g. Telegram). Leads that needed
+    extraction are always delivered: the chat client only ever saw them
+    incomplete. Leads that were complete already are only delivered with
+    `deliver_complete`, since the client has them in full. The latest job per
+    session is kept, up to `max_results` sessions, so clients can fetch the
+    finished lead later.
+    """
+
+    def __init__(self, deliver: Optional[DeliverFn] = None, deliver_complete: bool = False,
+                 max_pending: int = 1000, max_results: int = 10000):
+        self.deliver = deliver
+        self.deliver_complete = deliver_complete
+        self.max_results = max_results
+        self.jobs: "OrderedDict[str, LeadJob]" = OrderedDict()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.stats = {"submitted": 0, "extracted": 0, "delivered": 0, "failures": 0, "dropped": 0}
+
+    def submit(self, session_id: str, lead: Dict, extract: Optional[ExtractFn] = None) -> LeadJob:
+        job = LeadJob(lead, extract)
+        self.stats["submitted"] += 1
+        self.jobs[session_id] = job
+        self.jobs.move_to_end(session_id)
+        while len(self.jobs) > self.max_results:
+            self.jobs.popitem(last=False)
+
+        if extract is None and not (self.deliver is not None and self.deliver_complete):
+            job.done.set()
+            return job
+        try:
+            self.queue.put_nowait((session_id, job))
+        except asyncio.QueueFull:
+            # The lead is still returned to the widget, just without the extra fields
+            self.stats["dropped"] += 1
+            print(f"Lead queue full, finishing session {session_id} without extraction: {lead}")
+            job.done.set()
+        return job
+
+    def get(self, session_id: str) -> Optional[LeadJob]:
+        return self.jobs.get(session_id)
+
+    async def _finish(self, session_id: str, job: LeadJob):
+        if job.extract is not None:
+            try:
+                extracted = await job.extract() or {}
+                for name, value in job.lead.items():
+                    if not value and extracted.get(name):
+                        job.lead[name] = extracted[name]
+                self.stats["extracted"] += 1
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"Failed to extract lead for session {session_id}: {e}")
+        if self.deliver is not None:
+            try:
+                await self.deliver(session_id, job.lead)
+                self.stats["delivered"] += 1
+            except Exception as e:
+                self.stats["failures"] += 1
+                print(f"Failed to deliver lead for session {session_id}: {e}")
+
+    async def run_forever(self):
+        while True:
+            session_id, job = await self.queue.get()
+            try:
+                await self._finish(session_id, job)
+            finally:
+                job.done.set()
+
+    def snapshot(self) -> dict:
+        return {
+            "queue_length": self.queue.qsize(),
+            "pending": sum(job.pending for job in self.jobs.values()),
+            **self.stats,
+        }
@@ -0,0 +1,163 @@
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import google.generativeai as genai
+
+from key_pool import ApiKey, ApiKeyPool
+from prompt_cache import SystemPromptCache
+from retry import is_overload
+
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int = 0
+    total_tokens: int = 0
+
+
+class LLMBackend(ABC):
+    """Interface the chat server uses to talk to a model provider.
+
+    `history=None` means a one-off prompt without the system instruction (lead
+    extraction, summaries); a list (possibly empty) means a chat turn on top of
+    that history, with the system instruction applied. With `response_schema`
+    (an OpenAPI-style dict) `generate` returns JSON text matching it. Admission, retries,
+    deadlines and model tiers are handled by the caller, so they apply to every
+    backend alike.
+    """
+
+    name = "base"
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def count_tokens(self, text: str, model: str, timeout: Optional[float] = None) -> Optional[int]:
+        """Exact token count if the backend can provide one."""
+        return None
+
+    @abstractmethod
+    async def generate(self, message: str, *, model: str, history: Optional[List[Dict]] = None,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict] = None) -> Completion:
+        """The complete reply to `message`."""
+
+    @abstractmethod
+    def stream(self, message: str, *, model: str, history: List[Dict],
+               timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Async generator of reply text chunks for a chat turn."""
+
+    def snapshot(self) -> dict:
+        return {"name": self.name}
+
+
+def _usage(response) -> tuple:
+    usage = getattr(response, "usage_metadata", None)
+    return (
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "total_token_count", 0) or 0,
+    )
+
+
+class GeminiBackend(LLMBackend):
+    """google.generativeai backend with an API key pool and a cached system instruction."""
+
+    name = "gemini"
+
+    def __init__(self, api_keys: List[str], system_instruction: str, primary_model: str,
+                 key_pool_options: Optional[Dict] = None, prompt_cache_options: Optional[Dict] = None):
+        # The first key is the global default, also used for context caching
+        genai.configure(api_key=api_keys[0])
+        self.system_instruction = system_instruction
+        self.primary_model = primary_model
+        self.key_pool = ApiKeyPool(api_keys, **(key_pool_options or {}))
+        self.prompt_cache = SystemPromptCache(primary_model, system_instruction=system_instruction,
+                                              **(prompt_cache_options or {}))
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.prompt_cache.start()
+        self._refresher = asyncio.create_task(self.prompt_cache.refresh_forever())
+
+    async def close(self):
+        if self._refresher:
+            self._refresher.cancel()
+        await self.prompt_cache.close()
+
+    async def count_tokens(self, text: str, model: str, timeout: Optional[float] = None) -> Optional[int]:
+        request_options = {"timeout": timeout} if timeout else None
+        result = await genai.GenerativeModel(model).count_tokens_async(text, request_options=request_options)
+        return result.total_tokens
+
+    def _chat_model(self, key: ApiKey, model: str) -> genai.GenerativeModel:
+        # Cached content lives in the primary key's project and is pinned to the primary model
+        if key is self.key_pool.primary and model == self.primary_model:
+            return self.prompt_cache.model
+        return self.key_pool.model(
+            key, f"chat:{model}",
+            lambda: genai.GenerativeModel(model, system_instruction=self.system_instruction),
+        )
+
+    def _plain_model(self, key: ApiKey, model: str) -> genai.GenerativeModel:
+        return self.key_pool.model(key, f"plain:{model}", lambda: genai.GenerativeModel(model))
+
+    async def generate(self, message: str, *, model: str, history: Optional[List[Dict]] = None,
+                       timeout: Optional[float] = None, response_schema: Optional[Dict] = None) -> Completion:
+        request_options = {"timeout": timeout} if timeout else None
+        generation_config = None
+        if response_schema is not None:
+            generation_config = {"response_mime_type": "application/json", "response_schema": response_schema}
+        key = self.key_pool.acquire()
+        overloaded = False
+        try:
+            if history is None:
+                response = await self._plain_model(key, model).generate_content_async(
+                    message, generation_config=generation_config, request_options=request_options
+                )
+            else:
+                chat = self._chat_model(key, model).start_chat(history=history)
+                response = await chat.send_message_async(
+                    message, generation_config=generation_config, request_options=request_options
+                )
+            prompt_tokens, total_tokens = _usage(response)
+            self.key_pool.record_tokens(key, total_tokens)
+            return Completion(response.text, prompt_tokens, total_tokens)
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self.key_pool.release(key, overloaded)
+
+    async def stream(self, message: str, *, model: str, history: List[Dict],
+                     timeout: Optional[float] = None) -> AsyncIterator[str]:
+        # The transport timeout bounds the whole stream, not just the first chunk
+        request_options = {"timeout": timeout} if timeout else None
+        key = self.key_pool.acquire()
+        overloaded = False
+        try:
+            chat = self._chat_model(key, model).start_chat(history=history)
+            response = await chat.send_message_async(message, stream=True, request_options=request_options)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the final finish_reason chunk)
+                    continue
+                if text:
+                    yield text
+            self.key_pool.record_tokens(key, _usage(response)[1])
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self.key_pool.release(key, overloaded)
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "prompt_cache": self.prompt_cache.snapshot(),
+            "api_keys": self.key_pool.snapshot(),
+        }
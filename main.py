@@ -1,14 +1,39 @@
 import os
+import json
+import asyncio
+import hashlib
+import math
+import time
 import uvicorn
 import httpx
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import datetime
 from typing import List, Dict, Optional
-from fastapi import FastAPI, HTTPException, Body, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
 from dotenv import load_dotenv
 
+from response_cache import ResponseCache, normalize_message, prompt_fingerprint
+from semantic_cache import HashedNgramVectorizer, SemanticCache
+from prefilter import OffTopicClassifier, REFUSAL_REPLY
+from singleflight import SingleFlight
+from admission import AdmissionLimiter, AdmissionRejected
+from retry import RetryBudget, RetryPolicy, is_overload
+from llm import Completion, GeminiBackend, LLMBackend
+from fake_llm import FakeBackend
+from model_tiers import ModelTiers
+import deadline
+from deadline import DeadlineExceeded
+from token_budget import TokenEstimator, history_chars, trim_turns
+from turns import TurnBuffer
+from session_locks import SessionBusy, SessionLocks
+from summarizer import SUMMARY_ACK, SUMMARY_PREFIX, RollingSummarizer
+from session_store import MemorySessionStore, Session, SessionStore
+from leads import LeadDispatcher, LeadJob, LeadTracker
+
 # Load environment variables
 load_dotenv()
 # ... (rest of imports remain same, handled by target content replacement above if careful)
@@ -20,14 +45,36 @@ load_dotenv()
 # Load environment variables
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
+# "gemini" talks to the real API; "fake" is a scripted offline model for benchmarks
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Several keys (GEMINI_API_KEYS, comma-separated) raise the quota ceiling; the
+# first one is also the global default used for context caching.
+API_KEYS = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+if not API_KEYS and os.getenv("GEMINI_API_KEY"):
+    API_KEYS = [os.getenv("GEMINI_API_KEY")]
+if not API_KEYS and LLM_BACKEND == "gemini":
     raise ValueError("GEMINI_API_KEY environment variable not set")
 
-genai.configure(api_key=API_KEY)
+# Ordered model tiers: the primary (latest flash, for speed and efficiency)
+# followed by lighter fallbacks used while it is overloaded or slow.
+MODEL_TIERS = [m.strip() for m in os.getenv("GEMINI_MODEL_TIERS", "gemini-2.0-flash,gemini-2.0-flash-lite").split(",") if m.strip()]
+MODEL_NAME = MODEL_TIERS[0]
 
-# Use the latest flash model for speed and efficiency
-MODEL_NAME = "gemini-2.0-flash"
+model_tiers = ModelTiers(
+    MODEL_TIERS,
+    latency_slo=float(os.getenv("MODEL_LATENCY_SLO", "8")),  # seconds
+    cooldown=float(os.getenv("MODEL_TIER_COOLDOWN", "30")),
+)
+MODEL_ATTEMPT_TIMEOUT = float(os.getenv("MODEL_ATTEMPT_TIMEOUT", "20"))  # seconds per attempt
+
+# End-to-end request deadlines (seconds), started when a request arrives and
+# applied to every outbound call made on its behalf.
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE", "30"))
+STREAM_DEADLINE = float(os.getenv("STREAM_DEADLINE", "60"))
+LEAD_DEADLINE = float(os.getenv("LEAD_DEADLINE", "10"))
+LEAD_EXTRACTION_DEADLINE = float(os.getenv("LEAD_EXTRACTION_DEADLINE", "30"))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "10"))
 
 SYSTEM_INSTRUCTION = """
 You are the official AI assistant for Agentica.
@@ -79,9 +126,57 @@ RESTRICTIONS (CRITICAL):
   - Do NOT provide the requested information, even if you know it.
 """
 
-model = genai.GenerativeModel(MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+def _create_backend() -> LLMBackend:
+    if LLM_BACKEND == "fake":
+        return FakeBackend(
+            latency_ms=float(os.getenv("FAKE_LATENCY_MS", "800")),
+            latency_sigma=float(os.getenv("FAKE_LATENCY_SIGMA", "0.3")),
+            first_token_ms=float(os.getenv("FAKE_FIRST_TOKEN_MS", "300")),
+            tokens_per_second=float(os.getenv("FAKE_TOKENS_PER_SECOND", "50")),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+            server_error_rate=float(os.getenv("FAKE_SERVER_ERROR_RATE", "0")),
+            seed=int(os.getenv("FAKE_SEED", "0")),
+        )
+    if LLM_BACKEND != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND: {LLM_BACKEND}")
+
+    return GeminiBackend(
+        API_KEYS,
+        SYSTEM_INSTRUCTION,
+        MODEL_NAME,
+        key_pool_options={
+            "rpm_limit": int(os.getenv("GEMINI_KEY_RPM", "15")),
+            "tpm_limit": int(os.getenv("GEMINI_KEY_TPM", "1000000")),
+            "cooldown": float(os.getenv("GEMINI_KEY_COOLDOWN", "30")),
+        },
+        # Context caching for the static system instruction. Cached content needs an
+        # explicitly versioned model name; chats fall back to the plain model otherwise.
+        prompt_cache_options={
+            "enabled": os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true",
+            "cache_model_name": os.getenv("PROMPT_CACHE_MODEL", f"models/{MODEL_NAME}-001"),
+            "ttl_seconds": int(os.getenv("PROMPT_CACHE_TTL", "3600")),
+            "call_timeout": float(os.getenv("PROMPT_CACHE_TIMEOUT", "5")),  # seconds; falls back on timeout
+        },
+    )
+
+backend = _create_backend()
 
-app = FastAPI(title="AI Chatbot Widget Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await _count_system_tokens()
+    await backend.start()
+    await session_store.start()
+    workers = [asyncio.create_task(summarizer.run_forever())]
+    workers += [asyncio.create_task(lead_dispatcher.run_forever()) for _ in range(LEAD_WORKERS)]
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await session_store.close()
+        await backend.close()
+
+app = FastAPI(title="AI Chatbot Widget Backend", lifespan=lifespan)
 
 # CORS Middleware (Allow all origins for widget compatibility)
 app.add_middleware(
@@ -92,10 +187,134 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session storage (For production, use Redis/DB)
-# Format: { session_id: [ { role: "user"|"model", parts: ["message"] } ] }
-sessions: Dict[str, List[Dict]] = {}
-MAX_HISTORY = 20  # Limit history size
+# Session storage. Each Session holds the history
+# ([ { role: "user"|"model", parts: ["message"] } ]), the rolling summary and
+# the lead state. "memory" keeps them in this process (idle sessions expire and
+# the least recently used are evicted beyond the caps); "redis" shares them
+# between workers, so the app can run more than one process; "sqlite" persists
+# them on a single node, with the memory store as a hot cache in front.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))  # seconds
+SESSION_HISTORY_CAPACITY = int(os.getenv("SESSION_HISTORY_CAPACITY", "64"))  # messages (even), before token trimming
+# Trimmed messages awaiting a summary are sent verbatim; this caps them (and is reserved for them in the prompt)
+SUMMARY_MAX_PENDING_TOKENS = int(os.getenv("SUMMARY_MAX_PENDING_TOKENS", "1000"))
+
+def _create_session_store() -> SessionStore:
+    if SESSION_BACKEND == "redis":
+        # Optional dependency, only needed for this backend
+        from redis_session_store import RedisSessionStore
+        return RedisSessionStore(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            idle_ttl=SESSION_IDLE_TTL,
+            key_prefix=os.getenv("REDIS_KEY_PREFIX", "chat:session:"),
+            timeout=float(os.getenv("REDIS_TIMEOUT", "1")),  # seconds, per call (and for connecting)
+            history_capacity=SESSION_HISTORY_CAPACITY,
+        )
+    if SESSION_BACKEND not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+
+    memory_store = MemorySessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+        idle_ttl=SESSION_IDLE_TTL,
+        sweep_interval=float(os.getenv("SESSION_SWEEP_INTERVAL", "30")),
+        history_capacity=SESSION_HISTORY_CAPACITY,
+    )
+    if SESSION_BACKEND == "memory":
+        return memory_store
+
+    from sqlite_session_store import SQLiteSessionStore
+    return SQLiteSessionStore(
+        os.getenv("SQLITE_PATH", "sessions.db"),
+        hot=memory_store,
+        flush_interval=float(os.getenv("SQLITE_FLUSH_MS", "200")) / 1000,
+        retention=float(os.getenv("SQLITE_RETENTION_DAYS", "30")) * 86400,
+    )
+
+session_store = _create_session_store()
+
+# Turns for one session run one at a time. A request arriving mid-turn is
+# queued, rejected with 409 ("reject"), or, if it repeats the message in
+# flight, answered with that turn's reply ("merge").
+session_locks = SessionLocks(policy=os.getenv("SESSION_TURN_POLICY", "queue"))
+
+# History is trimmed (oldest user/model pairs first) so that the system
+# instruction, the summary, the turns awaiting a summary and the history
+# together stay within PROMPT_TOKEN_BUDGET tokens.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+MIN_HISTORY_TOKENS = int(os.getenv("MIN_HISTORY_TOKENS", "1000"))
+
+token_estimator = TokenEstimator()
+system_instruction_tokens = token_estimator.estimate(SYSTEM_INSTRUCTION)  # replaced by count_tokens at startup
+
+# Awaited during startup; on timeout the local estimate is used instead
+COUNT_TOKENS_TIMEOUT = float(os.getenv("COUNT_TOKENS_TIMEOUT", "3"))  # seconds
+
+async def _count_system_tokens():
+    """Count the system instruction once with the backend and calibrate the local estimator with it."""
+    global system_instruction_tokens
+    try:
+        tokens = await asyncio.wait_for(
+            backend.count_tokens(SYSTEM_INSTRUCTION, MODEL_NAME, timeout=COUNT_TOKENS_TIMEOUT), COUNT_TOKENS_TIMEOUT
+        )
+        if tokens:
+            token_estimator.observe(len(SYSTEM_INSTRUCTION), tokens)
+            system_instruction_tokens = tokens
+    except Exception as e:
+        print(f"Failed to count system instruction tokens, using the local estimate: {e!r}")
+
+# Turns evicted by trimming are summarized in the background on a cheap model
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", MODEL_TIERS[-1])
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "120"))
+
+def _history_budget(summary: str = "") -> int:
+    """Tokens left for the kept turns once everything sent ahead of them is accounted for.
+
+    The turns awaiting a summary are reserved at their cap, SUMMARY_MAX_PENDING_TOKENS:
+    trimming only moves turns there, so their actual size can't make room.
+    """
+    context_tokens = token_estimator.estimate(SUMMARY_PREFIX + summary + SUMMARY_ACK) if summary else 0
+    return max(
+        MIN_HISTORY_TOKENS,
+        PROMPT_TOKEN_BUDGET - system_instruction_tokens - context_tokens - SUMMARY_MAX_PENDING_TOKENS,
+    )
+
+# First-turn response cache. Replies to an empty history depend only on the
+# message, the system instruction and the model, so only the primary model's
+# replies are cached (and served).
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+
+response_cache = ResponseCache(
+    prompt_fingerprint(SYSTEM_INSTRUCTION, MODEL_NAME),
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl_seconds=RESPONSE_CACHE_TTL,
+)
+
+# Semantic cache for near-duplicate first-turn (or low-context) questions,
+# embedded locally with hashed character n-grams. Off by default until the
+# threshold is tuned on real traffic.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "10000"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_MAX_HISTORY = int(os.getenv("SEMANTIC_CACHE_MAX_HISTORY", "0"))  # messages
+
+semantic_cache = SemanticCache(
+    HashedNgramVectorizer(dim=int(os.getenv("SEMANTIC_CACHE_DIM", "256"))),
+    capacity=SEMANTIC_CACHE_SIZE,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=RESPONSE_CACHE_TTL,
+)
+
+# Local off-topic prefilter. "shadow" only compares its predictions with the
+# model's refusals; "enforce" answers confident predictions with the canned refusal.
+prefilter = OffTopicClassifier(
+    mode=os.getenv("PREFILTER_MODE", "shadow"),
+    threshold=float(os.getenv("PREFILTER_THRESHOLD", "0.9")),
+)
+
+# Concurrent identical prompts (same history, same normalized message) share one model call
+model_flights = SingleFlight()
 
 class ChatRequest(BaseModel):
     message: str
@@ -104,13 +323,473 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
     lead: Optional[Dict] = None
+    # Missing lead fields are still being extracted; the server delivers the finished
+    # lead itself (also available from GET /sessions/{session_id}/lead)
+    lead_pending: bool = False
+    # Model tier that answered; None for replies served from a cache or the prefilter
+    model: Optional[str] = None
+
+# Admission control in front of every model call: an AIMD concurrency limit
+# with a bounded queue, so bursts wait for quota instead of failing outright.
+admission = AdmissionLimiter(
+    initial_limit=int(os.getenv("ADMISSION_INITIAL_LIMIT", "16")),
+    max_limit=int(os.getenv("ADMISSION_MAX_LIMIT", "256")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "500")),
+    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "15")),
+)
+
+# Model call instrumentation (all backend calls are async)
+model_stats = {"in_flight": 0, "peak_in_flight": 0, "calls": 0, "errors": 0}
+
+# Transient model errors are retried with jittered backoff, within a global
+# budget of RETRY_BUDGET_RATIO extra calls per call.
+retry_policy = RetryPolicy(
+    RetryBudget(ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))),
+    max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+    max_delay=float(os.getenv("RETRY_MAX_DELAY", "8")),
+)
+
+@asynccontextmanager
+async def _model_call(model_name: Optional[str] = None):
+    """Admit and instrument a backend call (or stream), yielding the model tier to use.
+
+    The model is picked from the tiers unless `model_name` pins one.
+    """
+    async with admission.slot(max_wait=deadline.budget(admission.max_wait), is_overload=is_overload):
+        model_name = model_name or model_tiers.pick()
+        model_stats["calls"] += 1
+        model_stats["in_flight"] += 1
+        model_stats["peak_in_flight"] = max(model_stats["peak_in_flight"], model_stats["in_flight"])
+        try:
+            yield model_name
+        except Exception as e:
+            model_stats["errors"] += 1
+            if is_overload(e) or isinstance(e, asyncio.TimeoutError):
+                # The retry (if any) will pick the next healthy tier
+                model_tiers.report_failure(model_name)
+            raise
+        finally:
+            model_stats["in_flight"] -= 1
+
+def _calibrate(completion: Completion, history: List[Dict], user_message: str):
+    """Refine the local token estimator with the prompt size the backend actually billed."""
+    chars = len(SYSTEM_INSTRUCTION) + history_chars(history) + len(user_message)
+    token_estimator.observe(chars, completion.prompt_tokens)
+
+async def _timed(model_name: str, make_call, stage: str = "model"):
+    """Run `make_call(timeout)` within the attempt timeout and request deadline, reporting latency to the tiers."""
+    started = time.monotonic()
+    result = await deadline.within(stage, make_call, cap=MODEL_ATTEMPT_TIMEOUT)
+    model_tiers.report_latency(model_name, time.monotonic() - started)
+    return result
+
+LEAD_TOKEN = "[LEAD_COMPLETE]"
+
+class LeadTokenFilter:
+    """Removes LEAD_TOKEN from a stream of text chunks.
+
+    The token can be split across chunk boundaries, so any tail that could be
+    the start of the token is held back until the next chunk (or flush) decides it.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.found = False
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if LEAD_TOKEN in self.buffer:
+            self.found = True
+            self.buffer = self.buffer.replace(LEAD_TOKEN, "")
+
+        hold = 0
+        for size in range(min(len(LEAD_TOKEN) - 1, len(self.buffer)), 0, -1):
+            if LEAD_TOKEN.startswith(self.buffer[-size:]):
+                hold = size
+                break
+
+        out = self.buffer[:len(self.buffer) - hold]
+        self.buffer = self.buffer[len(self.buffer) - hold:]
+        return out
+
+    def flush(self) -> str:
+        out, self.buffer = self.buffer, ""
+        return out
+
+OVERLOADED_DETAIL = "The AI is currently overloaded. Please try again in a few seconds."
+BUSY_DETAIL = "The previous message in this conversation is still being answered."
+TIMEOUT_DETAIL = "The AI took too long to respond. Please try again."
+
+def _error_status(e: Exception):
+    """Map a model error to the (status_code, detail, retry_after) returned to the widget."""
+    if isinstance(e, DeadlineExceeded):
+        return 504, TIMEOUT_DETAIL, None
+    if isinstance(e, SessionBusy):
+        return 409, BUSY_DETAIL, None
+    current = deadline.current()
+    if isinstance(e, api_exceptions.DeadlineExceeded) and current is not None and current.expired:
+        # The transport gave up on our deadline just before asyncio did
+        deadline.record_exceeded("model")
+        return 504, TIMEOUT_DETAIL, None
+    if isinstance(e, AdmissionRejected):
+        return 429, OVERLOADED_DETAIL, max(1, math.ceil(e.retry_after))
+    if is_overload(e):
+        return 429, OVERLOADED_DETAIL, None
+    return 500, "Internal Server Error", None
+
+# Lead details are tracked locally on every turn; the model is only asked to
+# extract them when the local tracker missed a field.
+lead_tracker = LeadTracker()
+
+async def _deliver_lead(session_id: str, lead: Dict):
+    deadline.start(LEAD_DEADLINE)
+    await send_to_telegram(LeadRequest(
+        name=lead.get("name") or "Unknown",
+        contact=lead.get("contact") or "Unknown",
+        message=lead.get("message") or "Inquired via Chat",
+        page_url=f"Chat session {session_id}",
+    ))
+
+# Completed leads are finished by background workers: missing fields are
+# extracted and the finished lead is sent to Telegram. The widget posts leads
+# it received complete to /lead itself, so sending those too is opt-in
+# (LEAD_AUTO_NOTIFY). Leads that needed extraction are always sent from here,
+# since the widget only ever saw them partial.
+LEAD_AUTO_NOTIFY = os.getenv("LEAD_AUTO_NOTIFY", "false").lower() == "true"
+LEAD_WORKERS = int(os.getenv("LEAD_WORKERS", "4"))
+
+lead_dispatcher = LeadDispatcher(
+    deliver=_deliver_lead,
+    deliver_complete=LEAD_AUTO_NOTIFY,
+    max_pending=int(os.getenv("LEAD_MAX_PENDING", "1000")),
+)
+
+LEAD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "nullable": True},
+        "contact": {"type": "string", "nullable": True, "description": "Email and/or phone number"},
+        "message": {"type": "string", "nullable": True, "description": "The user's message or requirement"},
+    },
+}
+
+# /chat asks for the reply and the lead fields in one structured response, so
+# completing a lead needs no second round-trip.
+STRUCTURED_REPLIES = os.getenv("STRUCTURED_REPLIES", "true").lower() == "true"
+
+REPLY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reply": {"type": "string", "description": "The reply shown to the user, without [LEAD_COMPLETE]"},
+        "lead_complete": {"type": "boolean", "description": "True when this reply completes lead collection ([LEAD_COMPLETE])"},
+        **LEAD_SCHEMA["properties"],
+    },
+    "required": ["reply", "lead_complete"],
+}
+
+structured_stats = {"parsed": 0, "parse_failures": 0}
+
+def _parse_reply(text: str):
+    """Split a model reply into (reply_text, lead_found, lead_fields).
+
+    Structured replies carry the lead fields the model collected. Anything that
+    isn't the expected JSON is treated as a plain reply with an inline LEAD_TOKEN,
+    leaving the lead to the tracker and the extraction fallback.
+    """
+    lead_fields = None
+    lead_complete = False
+    if STRUCTURED_REPLIES:
+        try:
+            data = json.loads(text)
+            if not isinstance(data, dict) or not isinstance(data.get("reply"), str):
+                raise ValueError("unexpected structured reply")
+        except ValueError as e:
+            structured_stats["parse_failures"] += 1
+            print(f"Failed to parse structured reply, treating it as plain text: {e}")
+        else:
+            structured_stats["parsed"] += 1
+            text = data["reply"]
+            lead_complete = bool(data.get("lead_complete"))
+            if lead_complete:
+                lead_fields = {field: data.get(field) for field in LEAD_SCHEMA["properties"]}
+
+    lead_found = lead_complete or LEAD_TOKEN in text
+    if lead_found:
+        # Remove the token from the user-facing reply
+        text = text.replace(LEAD_TOKEN, "")
+    return text.strip(), lead_found, lead_fields
+
+def _transcript(messages: List[Dict]) -> str:
+    return "\n".join(f"{'Model' if m['role'] == 'model' else 'User'}: {m['parts'][0]}" for m in messages)
+
+# Fallback extraction only sees the collected fields and the latest messages
+LEAD_CONTEXT_MESSAGES = int(os.getenv("LEAD_CONTEXT_MESSAGES", "6"))
+
+async def _extract_lead(known: Dict, recent: List[Dict]) -> Optional[Dict]:
+    """Fill in the lead fields the tracker missed with a model call over the latest messages."""
+    try:
+        collected = "\n".join(f"- {field}: {value or '(missing)'}" for field, value in known.items())
+        extraction_prompt = f"""
+        The AI just completed a lead collection (marked by [LEAD_COMPLETE]).
+
+        Details collected so far:
+        {collected}
+
+        Latest messages:
+        {_transcript(recent)}
+
+        Fill in the missing details (name, contact as email/phone, message or
+        requirement) from what the user said. Keep the collected ones as they are.
+        """
+
+        async def _attempt():
+            async with _model_call() as model_name:
+                result = await _timed(
+                    model_name,
+                    lambda timeout: backend.generate(
+                        extraction_prompt, model=model_name, timeout=timeout, response_schema=LEAD_SCHEMA
+                    ),
+                    stage="lead_extraction",
+                )
+            return result.text
+
+        lead = json.loads(await retry_policy.call(_attempt, deadline=deadline.expires_at()))
+        if isinstance(lead, dict):
+            return lead
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Error extracting lead details: {e}")
+
+    return None
+
+def _complete_lead(session: Session, lead_fields: Optional[Dict] = None) -> LeadJob:
+    """Collect the lead from the structured reply and the tracker, and queue the rest in the background.
+
+    Missing fields are extracted by the model and the finished lead delivered
+    by the lead dispatcher, so the reply is never held up.
+    """
+    lead = lead_tracker.complete(session.lead)
+    for field, value in (lead_fields or {}).items():
+        if value and str(value).strip():
+            lead[field] = str(value).strip()
+
+    extract = None
+    if not all(lead.values()):
+        # The tracker's state plus the latest turns (copied, the history keeps changing)
+        recent = session.history.tail(LEAD_CONTEXT_MESSAGES)
+
+        async def extract():
+            deadline.start(LEAD_EXTRACTION_DEADLINE)
+            return await _extract_lead(dict(lead), recent)
+
+    return lead_dispatcher.submit(session.session_id, lead, extract)
+
+async def _save_turn(session: Session, user_message: str, reply_text: str, lead_found: bool = False,
+                     lead_fields: Optional[Dict] = None) -> Optional[LeadJob]:
+    lead_tracker.observe(session.lead, user_message, reply_text)
+
+    # Update local history; a full ring buffer drops its oldest pair
+    evicted = [turn.to_sdk() for turn in (
+        session.history.append("user", user_message),
+        session.history.append("model", reply_text),
+    ) if turn is not None]
+
+    # Trim history to the token budget; evicted turns are folded into the summary
+    evicted += trim_turns(session.history, _history_budget(session.summary), token_estimator)
+    summarizer.submit(session, evicted)
+
+    # The special token indicates the AI has finished collecting info.
+    # Completing the lead resets the session's lead state, so it comes before the save.
+    lead_job = _complete_lead(session, lead_fields) if lead_found else None
+
+    await session_store.save(session, evicted)
+    return lead_job
+
+def _prompt_history(session: Session) -> List[Dict]:
+    """History sent to the model: the running summary of evicted turns, then the kept turns."""
+    return summarizer.context(session) + session.history.to_sdk()
+
+async def _summarize(previous_summary: str, evicted: List[Dict]) -> str:
+    transcript = _transcript(evicted)
+    prompt = f"""
+    Update the running summary of a sales chat with the new messages below.
+    Always keep the user's name, email, phone number and stated requirements,
+    which products they asked about, and which lead collection step was reached.
+    Reply with the updated summary only, in at most {SUMMARY_MAX_WORDS} words.
+
+    Current summary:
+    {previous_summary or "(none)"}
+
+    New messages:
+    {transcript}
+    """
+
+    async with _model_call(SUMMARY_MODEL) as model_name:
+        result = await _timed(
+            model_name,
+            lambda timeout: backend.generate(prompt, model=model_name, timeout=timeout),
+            stage="summary",
+        )
+    return result.text
+
+summarizer = RollingSummarizer(
+    _summarize,
+    token_estimator.estimate,
+    max_pending_tokens=SUMMARY_MAX_PENDING_TOKENS,
+    on_summary=session_store.save_summary,
+)
+
+def _shortcut_reply(session: Session, user_message: str) -> Optional[str]:
+    """Return a reply that can be served without calling the model, if any."""
+    history = session.history
+    # Mid lead flow the message answers the model's question (e.g. describes the
+    # prospect's business), so it is never refused as off-topic
+    if session.lead.step is None and prefilter.should_refuse(user_message):
+        return REFUSAL_REPLY
+    if not history:
+        reply = response_cache.get(user_message)
+        if reply is not None:
+            return reply
+    if SEMANTIC_CACHE_ENABLED and len(history) <= SEMANTIC_CACHE_MAX_HISTORY:
+        return semantic_cache.get(user_message)
+    return None
+
+async def _generate_reply(history: List[Dict], user_message: str):
+    """The model's reply and the tier that gave it, as (text, model_name)."""
+    response_schema = REPLY_SCHEMA if STRUCTURED_REPLIES else None
+
+    async def _attempt():
+        # Send message to model without blocking the event loop
+        async with _model_call() as model_name:
+            completion = await _timed(
+                model_name,
+                lambda timeout: backend.generate(
+                    user_message, model=model_name, history=history, timeout=timeout, response_schema=response_schema
+                ),
+            )
+        _calibrate(completion, history, user_message)
+        return completion.text, model_name
+
+    return await retry_policy.call(_attempt, deadline=deadline.expires_at())
+
+async def _first_chunk(chunks) -> str:
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return ""
+
+async def _rest_of_stream(first: str, chunks):
+    if first:
+        yield first
+    async for chunk in chunks:
+        yield chunk
+
+async def _open_stream(history: List[Dict], user_message: str):
+    """Start a streaming reply; returns (stack, chunks, model_name).
+
+    The admission slot is held until the returned stack is closed. Opening means
+    waiting for the first chunk, so errors surface (and are retried) before
+    anything is sent to the client; once chunks have been sent a failure is final.
+    """
+    async def _attempt():
+        stack = AsyncExitStack()
+        model_name = await stack.enter_async_context(_model_call())
+        try:
+            # The stream's own timeout covers the whole reply, not just the first chunk
+            chunks = backend.stream(user_message, model=model_name, history=history, timeout=deadline.budget())
+            stack.push_async_callback(chunks.aclose)
+            # Time-to-first-token is what the tiers' latency SLO sees for streams
+            first = await _timed(model_name, lambda timeout: _first_chunk(chunks))
+        except BaseException as e:
+            await stack.__aexit__(type(e), e, e.__traceback__)
+            raise
+        return stack, _rest_of_stream(first, chunks), model_name
+
+    return await retry_policy.call(_attempt, deadline=deadline.expires_at())
+
+def _flight_key(history: List[Dict], user_message: str) -> str:
+    history_hash = hashlib.sha256(json.dumps(history, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{history_hash}:{normalize_message(user_message)}"
+
+async def _complete_turn(session: Session, history: TurnBuffer, user_message: str, reply_text: str, lead_found: bool,
+                         model_name: str, lead_fields: Optional[Dict] = None) -> Optional[LeadJob]:
+    """Shared tail of every chat turn: cache fill, history update and lead hand-off."""
+    if session.lead.step is None:
+        # Mid lead flow the prefilter isn't consulted, so there is nothing to compare
+        prefilter.observe(user_message, reply_text)
+
+    # A fallback tier's reply must not be served later as the primary model's
+    if not lead_found and model_name == model_tiers.primary:
+        if not history:
+            response_cache.put(user_message, reply_text)
+        if SEMANTIC_CACHE_ENABLED and len(history) <= SEMANTIC_CACHE_MAX_HISTORY:
+            semantic_cache.put(user_message, reply_text)
+
+    return await _save_turn(session, user_message, reply_text, lead_found, lead_fields)
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "model": MODEL_NAME}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "model": dict(model_stats),
+        "admission": admission.snapshot(),
+        "retry": retry_policy.snapshot(),
+        "backend": backend.snapshot(),
+        "model_tiers": model_tiers.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "semantic_cache": semantic_cache.snapshot(),
+        "prefilter": prefilter.snapshot(),
+        "single_flight": model_flights.snapshot(),
+        "session_locks": session_locks.snapshot(),
+        "deadlines": deadline.snapshot(),
+        "sessions": session_store.snapshot(),
+        "summarizer": summarizer.snapshot(),
+        "leads": lead_tracker.snapshot(),
+        "lead_jobs": lead_dispatcher.snapshot(),
+        "structured_replies": {"enabled": STRUCTURED_REPLIES, **structured_stats},
+        "history": {
+            "system_instruction_tokens": system_instruction_tokens,
+            "history_token_budget": _history_budget(),
+            "chars_per_token": round(token_estimator.chars_per_token, 3),
+        },
+    }
+
+async def _chat_turn(session_id: str, user_message: str):
+    """Answer one /chat turn; returns (reply, lead_job, model_name)."""
+    # Initialize session if not exists
+    session = await session_store.load(session_id)
+    history = session.history
+
+    cached_reply = _shortcut_reply(session, user_message)
+    if cached_reply is not None:
+        # Still recorded in the session so later turns stay coherent
+        await _save_turn(session, user_message, cached_reply)
+        return cached_reply, None, None
+
+    # Identical concurrent requests await a single shared model call,
+    # each waiting no longer than its own deadline
+    prompt_history = _prompt_history(session)
+    model_text, model_name = await deadline.within(
+        "single_flight",
+        lambda timeout: model_flights.do(
+            _flight_key(prompt_history, user_message),
+            lambda: _generate_reply(prompt_history, user_message),
+        ),
+    )
+    reply_text, lead_found, lead_fields = _parse_reply(model_text)
+
+    lead_job = await _complete_turn(session, history, user_message, reply_text, lead_found, model_name, lead_fields)
+    return reply_text, lead_job, model_name
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
+    deadline.start(CHAT_DEADLINE)
     try:
         session_id = request.session_id
         user_message = request.message.strip()
@@ -118,88 +797,189 @@ async def chat_endpoint(request: ChatRequest):
         if not user_message:
             raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-        # Initialize session if not exists
-        if session_id not in sessions:
-            sessions[session_id] = []
-
-        history = sessions[session_id]
-
-        # Start chat with history
-        chat = model.start_chat(history=history)
-
-        # Send message to model
-        response = chat.send_message(user_message)
-        reply_text = response.text
-        
-        updated_lead_data = None
-        
-        updated_lead_data = None
-
-        # Check for the special token indicating the AI has finished collecting info
-        if "[LEAD_COMPLETE]" in reply_text:
-            # Remove the token from the user-facing reply
-            reply_text = reply_text.replace("[LEAD_COMPLETE]", "").strip()
-            
-            # Now we need to extract the collected info from the conversation history
-            # We use a quick internal call to get the structured data
-            try:
-                # Construct history string to context for extraction
-                history_text = ""
-                for m in history:
-                    role_label = "Model" if m["role"] == "model" else "User"
-                    history_text += f"{role_label}: {m['parts'][0]}\n"
-                
-                history_text += f"User: {user_message}\nModel: {reply_text}"
-                
-                extractor_model = genai.GenerativeModel("gemini-2.0-flash")
-                extraction_prompt = f"""
-                Analyze this conversation history:
-                {history_text}
-                
-                The AI just completed a lead collection (marked by [LEAD_COMPLETE]). 
-                Extract the final confirmed details provided by the user:
-                - Name
-                - Contact (Email/Phone)
-                - Message/Requirement
-                
-                Return ONLY a JSON object: {{"name": "...", "contact": "...", "message": "..."}}
-                """
-                
-                result = extractor_model.generate_content(extraction_prompt)
-                
-                # Naive JSON parsing
-                import json
-                text = result.text.strip()
-                start = text.find('{')
-                end = text.rfind('}') + 1
-                if start != -1 and end != -1:
-                    json_str = text[start:end]
-                    updated_lead_data = json.loads(json_str)
-                
-            except Exception as e:
-                print(f"Error extracting lead details: {e}")
+        async with session_locks.hold(session_id, user_message) as turn:
+            if turn.merged:
+                reply_text, lead_job, model_name = await turn.shared_result()
+            else:
+                reply_text, lead_job, model_name = await _chat_turn(session_id, user_message)
+                turn.set_result((reply_text, lead_job, model_name))
+
+        return ChatResponse(reply=reply_text, model=model_name, **_lead_payload(lead_job))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error processing chat request: {e}")
+        status_code, detail, retry_after = _error_status(e)
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        raise HTTPException(status_code=status_code, detail=detail, headers=headers)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_turn(session_id: str, user_message: str):
+    """Stream a chat turn as text chunks, then yield the final (reply, lead_job, model_name) tuple.
+
+    The session is held while the reply is produced (see session_locks). A
+    merged duplicate gets the in-flight turn's reply as a single chunk. The
+    final tuple is only yielded once the session is released, so a caller
+    waiting on the lead job afterwards doesn't hold up the session's next turn.
+    """
+    async with session_locks.hold(session_id, user_message) as turn:
+        if turn.merged:
+            result = await turn.shared_result()
+            yield result[0]
+        else:
+            async for item in _stream_owned_turn(session_id, user_message):
+                if isinstance(item, str):
+                    yield item
+                else:
+                    result = item
+                    turn.set_result(result)
+    yield result
+
+async def _stream_owned_turn(session_id: str, user_message: str):
+    """The streaming turn itself, once the session is held.
+
+    The session history is only updated after the model stream has finished, so a
+    client that disconnects mid-reply leaves the conversation untouched.
+    """
+    session = await session_store.load(session_id)
+    history = session.history
+
+    cached_reply = _shortcut_reply(session, user_message)
+    if cached_reply is not None:
+        await _save_turn(session, user_message, cached_reply)
+        yield cached_reply
+        yield cached_reply, None, None
+        return
+
+    token_filter = LeadTokenFilter()
+    parts = []
+
+    stack, chunks, model_name = await _open_stream(_prompt_history(session), user_message)
+    async with stack:
+        async for chunk_text in chunks:
+            text = token_filter.feed(chunk_text)
+            if text:
+                parts.append(text)
+                yield text
 
-        # Update local history
-        sessions[session_id].append({"role": "user", "parts": [user_message]})
-        sessions[session_id].append({"role": "model", "parts": [reply_text]})
+    tail = token_filter.flush()
+    if tail:
+        parts.append(tail)
+        yield tail
 
-        # Trim history
-        if len(sessions[session_id]) > MAX_HISTORY:
-            sessions[session_id] = sessions[session_id][-MAX_HISTORY:]
+    reply_text = "".join(parts).strip()
+    lead_job = await _complete_turn(session, history, user_message, reply_text, token_filter.found, model_name)
+    yield reply_text, lead_job, model_name
 
-        return ChatResponse(reply=reply_text, lead=updated_lead_data)
+def _lead_payload(lead_job: Optional[LeadJob]) -> Dict:
+    if lead_job is None:
+        return {"lead": None, "lead_pending": False}
+    return {"lead": lead_job.lead, "lead_pending": lead_job.pending}
 
+async def _finished_lead(lead_job: Optional[LeadJob]) -> Optional[LeadJob]:
+    """Wait (within the request deadline) for a pending lead job; None if there is nothing to report."""
+    if lead_job is None or not lead_job.pending:
+        return None
+    try:
+        await asyncio.wait_for(lead_job.done.wait(), deadline.budget())
+    except asyncio.TimeoutError:
+        pass
+    return lead_job
+
+async def _sse_events(session_id: str, user_message: str):
+    deadline.start(STREAM_DEADLINE)
+    try:
+        async for item in _stream_turn(session_id, user_message):
+            if isinstance(item, str):
+                yield _sse("token", {"text": item})
+            else:
+                reply_text, lead_job, model_name = item
+                yield _sse("done", {"reply": reply_text, "model": model_name, **_lead_payload(lead_job)})
+                # The full reply is out; the extracted lead follows as its own event
+                lead_job = await _finished_lead(lead_job)
+                if lead_job is not None:
+                    yield _sse("lead", _lead_payload(lead_job))
     except Exception as e:
-        error_msg = str(e)
-        print(f"Error processing chat request: {error_msg}")
-        
-        if "429" in error_msg or "Resource exhausted" in error_msg:
-            raise HTTPException(
-                status_code=429, 
-                detail="The AI is currently overloaded. Please try again in a few seconds."
-            )
-            
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+        print(f"Error streaming chat request: {e}")
+        status_code, detail, retry_after = _error_status(e)
+        yield _sse("error", {"status": status_code, "detail": detail, "retry_after": retry_after})
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Server-Sent Events variant of /chat.
+
+    Emits `token` events as the reply is generated and a `done` event carrying
+    the full reply, the model tier that answered and the lead (if any). When lead fields are still being
+    extracted (`lead_pending`), a final `lead` event follows once they are.
+    """
+    user_message = request.message.strip()
+    if not user_message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+
+    return StreamingResponse(
+        _sse_events(request.session_id, user_message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws/{session_id}")
+async def chat_websocket(websocket: WebSocket, session_id: str):
+    """Persistent chat transport: one connection per widget session.
+
+    The client sends either plain text or {"message": "..."} frames. Each turn is
+    answered with {"type": "token"} frames followed by a {"type": "done"} frame
+    (and a {"type": "lead"} frame if lead fields were still pending), using the
+    same history and lead handling as /chat.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                payload = json.loads(raw)
+                user_message = payload.get("message", "") if isinstance(payload, dict) else raw
+            except ValueError:
+                user_message = raw
+            user_message = str(user_message).strip()
+
+            if not user_message:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Message cannot be empty"})
+                continue
+
+            deadline.start(STREAM_DEADLINE)
+            try:
+                async for item in _stream_turn(session_id, user_message):
+                    if isinstance(item, str):
+                        await websocket.send_json({"type": "token", "text": item})
+                    else:
+                        reply_text, lead_job, model_name = item
+                        await websocket.send_json(
+                            {"type": "done", "reply": reply_text, "model": model_name, **_lead_payload(lead_job)}
+                        )
+                        lead_job = await _finished_lead(lead_job)
+                        if lead_job is not None:
+                            await websocket.send_json({"type": "lead", **_lead_payload(lead_job)})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                print(f"Error processing websocket message: {e}")
+                status_code, detail, retry_after = _error_status(e)
+                await websocket.send_json(
+                    {"type": "error", "status": status_code, "detail": detail, "retry_after": retry_after}
+                )
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/sessions/{session_id}/lead")
+async def session_lead(session_id: str):
+    """The session's latest completed lead, including fields extracted in the background."""
+    lead_job = lead_dispatcher.get(session_id)
+    if lead_job is None:
+        raise HTTPException(status_code=404, detail="No lead for this session")
+    return _lead_payload(lead_job)
 
 # Telegram Configuration
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
@@ -237,14 +1017,24 @@ async def send_to_telegram(lead: LeadRequest):
 
     async with httpx.AsyncClient() as client:
         try:
-            await client.post(url, json=payload)
+            await deadline.within(
+                "telegram",
+                lambda timeout: client.post(url, json=payload, timeout=timeout),
+                cap=TELEGRAM_TIMEOUT,
+            )
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Failed to send Telegram message: {e}")
 
 @app.post("/lead")
 async def lead_endpoint(lead: LeadRequest):
+    deadline.start(LEAD_DEADLINE)
     # Asynchronously send to Telegram so we don't block the user
-    await send_to_telegram(lead)
+    try:
+        await send_to_telegram(lead)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Timed out delivering the lead")
     return {"status": "received"}
 
 if __name__ == "__main__":
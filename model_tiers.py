@@ -0,0 +1,68 @@
+import time
+from typing import Dict, List
+
+
+class ModelTiers:
+    """Ordered list of models, from preferred to lightest fallback.
+
+    A tier that returns 429, times out or breaches the latency SLO is marked
+    degraded for `cooldown` seconds, and calls go to the first healthy tier
+    after it. Once the cool-down passes the primary is picked again, so fail
+    back is automatic. If every tier is degraded the last one is used.
+    """
+
+    def __init__(self, models: List[str], latency_slo: float = 8.0, cooldown: float = 30.0):
+        if not models:
+            raise ValueError("At least one model tier is required")
+        self.models = models
+        self.latency_slo = latency_slo
+        self.cooldown = cooldown
+        self.degraded_until: Dict[str, float] = {model: 0.0 for model in models}
+        self.stats = {
+            model: {"calls": 0, "failures": 0, "slo_breaches": 0} for model in models
+        }
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def pick(self) -> str:
+        now = time.monotonic()
+        for model in self.models:
+            if self.degraded_until[model] <= now:
+                break
+        else:
+            model = self.models[-1]
+        self.stats[model]["calls"] += 1
+        return model
+
+    def _degrade(self, model: str):
+        self.degraded_until[model] = time.monotonic() + self.cooldown
+        print(f"Model tier {model} degraded for {self.cooldown:.0f}s")
+
+    def report_failure(self, model: str):
+        """Record a 429 or timeout from `model`."""
+        if model not in self.stats:
+            return  # pinned model outside the tier list
+        self.stats[model]["failures"] += 1
+        self._degrade(model)
+
+    def report_latency(self, model: str, seconds: float):
+        if model not in self.stats:
+            return
+        if seconds > self.latency_slo:
+            self.stats[model]["slo_breaches"] += 1
+            self._degrade(model)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        total = sum(s["calls"] for s in self.stats.values())
+        fallbacks = total - self.stats[self.primary]["calls"]
+        return {
+            "models": self.models,
+            "fallback_rate": fallbacks / total if total else 0.0,
+            "tiers": {
+                model: {"degraded": self.degraded_until[model] > now, **self.stats[model]}
+                for model in self.models
+            },
+        }
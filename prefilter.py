@@ -0,0 +1,108 @@
+import math
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+from response_cache import normalize_message
+
+# The fixed sentence SYSTEM_INSTRUCTION tells the model to answer off-topic questions with
+REFUSAL_REPLY = "I am designed to assist only with Agentica's AI services and products. How can I help you with those?"
+REFUSAL_MARKER = "designed to assist only with agentica"
+
+# Hand-tuned term weights: positive pushes towards off-topic, negative towards on-topic.
+# Bigrams are written with a single space, matching the feature extraction below.
+OFF_TOPIC_TERMS: Dict[str, float] = {
+    "recipe": 3.0, "recipes": 3.0, "cook": 2.5, "cooking": 2.5, "bake": 2.5, "baking": 2.5,
+    "pasta": 2.5, "pizza": 2.0, "cake": 2.0, "ingredients": 2.5,
+    "football": 3.0, "soccer": 3.0, "cricket": 3.0, "basketball": 3.0, "nba": 3.0, "nfl": 3.0,
+    "world cup": 3.0, "match score": 2.5, "who won": 2.5,
+    "weather": 3.0, "forecast": 2.0, "movie": 2.5, "movies": 2.5, "song": 2.5, "lyrics": 3.0,
+    "python": 2.5, "javascript": 2.5, "java": 2.0, "sql": 2.0, "html": 2.0, "code": 1.5,
+    "coding": 2.0, "debug": 2.0, "function": 1.0, "algorithm": 2.0, "write a": 1.0,
+    "capital of": 3.0, "president": 2.5, "history of": 2.0, "homework": 3.0, "equation": 2.5,
+    "math": 2.0, "poem": 3.0, "joke": 2.5, "horoscope": 3.0, "translate": 2.0, "essay": 2.5,
+    "agentica": -4.0, "product": -2.5, "products": -2.5, "linkedin": -3.0, "autopilot": -3.0,
+    "crm": -3.0, "intelligence": -1.5, "knowledgeos": -3.0, "inbox": -2.5, "operator": -1.5,
+    "socialos": -3.0, "conversational": -2.0, "automation": -2.5, "automate": -2.5, "agent": -1.5,
+    "ai": -1.5, "lead": -2.0, "leads": -2.0, "demo": -3.0, "price": -3.0, "pricing": -3.0,
+    "cost": -2.0, "meeting": -2.5, "implementation": -2.5, "implement": -2.0, "service": -2.0,
+    "services": -2.0, "business": -2.0, "sales": -2.0, "marketing": -2.0, "integrate": -2.0,
+    "email": -2.0, "phone": -2.0, "name": -1.5, "contact": -2.0, "help": -1.0,
+    "chatbot": -4.0, "chatbots": -4.0, "chat bot": -4.0, "bot": -3.0, "bots": -3.0, "assistant": -2.0,
+    "website": -3.0, "site": -2.0, "customers": -2.0, "we run": -1.5, "our business": -2.0,
+}
+OFF_TOPIC_BIAS = -3.0
+
+
+class OffTopicClassifier:
+    """Local linear model that spots questions the system prompt would refuse.
+
+    Word unigrams and bigrams are hashed into a fixed-size feature space and scored
+    against a NumPy weight vector, so a prediction costs microseconds. In shadow
+    mode predictions are only compared with the model's actual replies, which is
+    how `threshold` should be tuned before switching to enforce mode.
+    """
+
+    MODES = ("off", "shadow", "enforce")
+
+    def __init__(self, mode: str = "shadow", threshold: float = 0.9, dim: int = 4096,
+                 terms: Dict[str, float] = OFF_TOPIC_TERMS, bias: float = OFF_TOPIC_BIAS):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown prefilter mode: {mode}")
+        self.mode = mode
+        self.threshold = threshold
+        self.dim = dim
+        self.bias = bias
+        self.weights = np.zeros(dim, dtype=np.float32)
+        for term, weight in terms.items():
+            self.weights[self._bucket(term)] += weight
+        self.stats = {"short_circuits": 0, "agree": 0, "disagree": 0,
+                      "true_positive": 0, "false_positive": 0, "false_negative": 0, "true_negative": 0}
+
+    def _bucket(self, feature: str) -> int:
+        return zlib.crc32(feature.encode("utf-8")) % self.dim
+
+    def _features(self, message: str) -> List[int]:
+        words = normalize_message(message).split()
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return sorted({self._bucket(f) for f in features})
+
+    def score(self, message: str) -> float:
+        """Probability-like confidence that the message is off-topic."""
+        logit = self.bias + float(self.weights[self._features(message)].sum())
+        return 1.0 / (1.0 + math.exp(-logit))
+
+    def should_refuse(self, message: str) -> bool:
+        """True when the canned refusal should be returned without calling the model."""
+        if self.mode != "enforce" or self.score(message) < self.threshold:
+            return False
+        self.stats["short_circuits"] += 1
+        return True
+
+    def observe(self, message: str, model_reply: str):
+        """Record whether the prediction for `message` agrees with the model's reply."""
+        if self.mode == "off":
+            return
+        predicted = self.score(message) >= self.threshold
+        refused = REFUSAL_MARKER in model_reply.lower()
+        self.stats["agree" if predicted == refused else "disagree"] += 1
+        if predicted and refused:
+            self.stats["true_positive"] += 1
+        elif predicted:
+            self.stats["false_positive"] += 1
+            print(f"Prefilter false positive: {message!r}")
+        elif refused:
+            self.stats["false_negative"] += 1
+            print(f"Prefilter false negative: {message!r}")
+        else:
+            self.stats["true_negative"] += 1
+
+    def snapshot(self) -> dict:
+        observed = self.stats["agree"] + self.stats["disagree"]
+        return {
+            "mode": self.mode,
+            "threshold": self.threshold,
+            "agreement_rate": self.stats["agree"] / observed if observed else None,
+            **self.stats,
+        }
@@ -0,0 +1,115 @@
+import asyncio
+import datetime
+from typing import Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import caching
+
+
+def _is_permanent(e: Exception) -> bool:
+    """4xx rejections other than rate limits, e.g. InvalidArgument for a prompt below the minimum cacheable size."""
+    return isinstance(e, api_exceptions.ClientError) and not isinstance(e, api_exceptions.TooManyRequests)
+
+
+class SystemPromptCache:
+    """Serves chat models backed by a Gemini cached-content object for the system instruction.
+
+    The static system prompt is uploaded once as cached content and referenced by
+    every chat, so it is not re-billed as input on each turn. The cache TTL is
+    extended periodically by `refresh_forever`. If caching is disabled, not
+    supported for the model, or the prompt is below the minimum cacheable size,
+    `model` falls back to a plain GenerativeModel(system_instruction=...).
+    Creation rejected for a permanent reason is not retried; the fallback
+    stays in use until restart. Every caching call is bounded by
+    `call_timeout`, so a slow caching endpoint never holds up startup.
+    """
+
+    def __init__(self, model_name: str, cache_model_name: str, system_instruction: str,
+                 ttl_seconds: int = 3600, enabled: bool = True, call_timeout: float = 5.0):
+        self.model_name = model_name
+        self.cache_model_name = cache_model_name
+        self.system_instruction = system_instruction
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+        self.enabled = enabled
+        self.call_timeout = call_timeout
+        self.fallback_model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        self.cached_content: Optional[caching.CachedContent] = None
+        self.cached_model: Optional[genai.GenerativeModel] = None
+        self.unsupported: Optional[str] = None  # why creation was rejected for good, if it was
+        self.stats = {"creates": 0, "refreshes": 0, "failures": 0}
+
+    @property
+    def model(self) -> genai.GenerativeModel:
+        return self.cached_model or self.fallback_model
+
+    @property
+    def active(self) -> bool:
+        return self.cached_model is not None
+
+    async def start(self):
+        if self.enabled:
+            await self._create()
+
+    async def _call(self, fn, *args, **kwargs):
+        # The caching API is synchronous and takes no timeout; keep it off the event
+        # loop and stop waiting after call_timeout (the thread itself can't be stopped)
+        return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), self.call_timeout)
+
+    async def _create(self):
+        try:
+            self.cached_content = await self._call(
+                caching.CachedContent.create,
+                model=self.cache_model_name,
+                display_name="agentica-system-instruction",
+                system_instruction=self.system_instruction,
+                ttl=self.ttl,
+            )
+            self.cached_model = genai.GenerativeModel.from_cached_content(cached_content=self.cached_content)
+            self.stats["creates"] += 1
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.cached_content = None
+            self.cached_model = None
+            if _is_permanent(e):
+                self.unsupported = str(e)
+                print(f"Context caching not supported, using plain system instruction from now on: {e}")
+            else:
+                print(f"Context caching unavailable, using plain system instruction: {e!r}")
+
+    async def refresh(self):
+        if not self.enabled or self.unsupported:
+            return
+        if self.cached_content is None:
+            await self._create()
+            return
+        try:
+            await self._call(self.cached_content.update, ttl=self.ttl)
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            # Expired or deleted server-side; recreate (or fall back if that fails too)
+            print(f"Failed to refresh cached system instruction: {e!r}")
+            await self._create()
+
+    async def refresh_forever(self):
+        interval = max(self.ttl.total_seconds() / 2, 30)
+        while not self.unsupported:
+            await asyncio.sleep(interval)
+            await self.refresh()
+
+    async def close(self):
+        if self.cached_content is not None:
+            try:
+                await self._call(self.cached_content.delete)
+            except Exception as e:
+                print(f"Failed to delete cached system instruction: {e!r}")
+            self.cached_content = None
+            self.cached_model = None
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "cache_name": self.cached_content.name if self.cached_content else None,
+            "unsupported": self.unsupported,
+            **self.stats,
+        }
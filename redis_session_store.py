@@ -0,0 +1,138 @@
+import json
+import math
+import weakref
+from typing import Dict, List
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+import deadline
+from session_store import Session, SessionStore, dump_lead, dump_message, dump_turns, load_lead, load_message, load_turns
+
+
+def _dump_pending(message: Dict) -> str:
+    return json.dumps(dump_message(message), ensure_ascii=False, separators=(",", ":"))
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions in Redis (or any server speaking its protocol), shared by all workers.
+
+    Each session is a hash (history, summary, lead state) plus a list of
+    trimmed turns waiting to be summarized. Both keys share the session's hash
+    tag, so they live on the same cluster slot. A load or a plain save is one
+    pipelined round trip. Every save pushes the expiry out by `idle_ttl`, so
+    Redis expires idle sessions itself.
+
+    Turns trimmed by a request are appended to the pending list. Turns leave
+    it from the front, when the summarizer folds them in or drops them over
+    its cap. The hash records the position of the list's first turn among all
+    turns ever trimmed (`pending_base`). Removal is by position, in a WATCH
+    transaction, so concurrent appends and removals never cut turns that
+    weren't summarized. Every call is bounded by `timeout` and the request deadline.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", idle_ttl: float = 3600,
+                 key_prefix: str = "chat:session:", timeout: float = 1.0, history_capacity: int = 64, client=None):
+        self.client = client if client is not None else redis.from_url(
+            url, decode_responses=True, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+        self.idle_ttl = max(1, math.ceil(idle_ttl))
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self.history_capacity = history_capacity
+        # pending_base of each loaded session as Redis last had it, to tell when a save must trim
+        self._stored_base: "weakref.WeakKeyDictionary[Session, int]" = weakref.WeakKeyDictionary()
+        self.stats = {"loads": 0, "created": 0, "saves": 0, "summary_saves": 0, "trims": 0, "conflicts": 0}
+
+    def _keys(self, session_id: str):
+        key = f"{self.key_prefix}{{{session_id}}}"
+        return key, f"{key}:pending"
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def load(self, session_id: str) -> Session:
+        return await deadline.within("session_store", lambda timeout: self._load(session_id), cap=self.timeout)
+
+    async def save(self, session: Session, evicted: List[Dict]):
+        await deadline.within("session_store", lambda timeout: self._save(session, evicted), cap=self.timeout)
+
+    async def save_summary(self, session: Session, summarized: int):
+        await deadline.within("session_store", lambda timeout: self._save_summary(session), cap=self.timeout)
+
+    async def _load(self, session_id: str) -> Session:
+        key, pending_key = self._keys(session_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.lrange(pending_key, 0, -1)
+            fields, pending = await pipe.execute()
+
+        self.stats["loads"] += 1
+        if not fields:
+            self.stats["created"] += 1
+        session = Session(
+            session_id,
+            history=load_turns(fields.get("history"), self.history_capacity),
+            summary=fields.get("summary", ""),
+            pending=[load_message(json.loads(item)) for item in pending],
+            pending_base=int(fields.get("pending_base", 0)),
+            lead=load_lead(fields.get("lead")),
+        )
+        self._stored_base[session] = session.pending_base
+        return session
+
+    def _queue_save(self, pipe, session: Session, evicted: List[Dict]):
+        key, pending_key = self._keys(session.session_id)
+        pipe.hset(key, mapping={"history": dump_turns(session.history), "lead": dump_lead(session.lead)})
+        if evicted:
+            pipe.rpush(pending_key, *(_dump_pending(m) for m in evicted))
+        pipe.expire(key, self.idle_ttl)
+        pipe.expire(pending_key, self.idle_ttl)
+
+    async def _save(self, session: Session, evicted: List[Dict]):
+        if session.pending_base > self._stored_base.get(session, 0):
+            # The summarizer dropped pending turns over its cap
+            await self._trim(session, lambda pipe: self._queue_save(pipe, session, evicted))
+        else:
+            async with self.client.pipeline(transaction=True) as pipe:
+                self._queue_save(pipe, session, evicted)
+                await pipe.execute()
+        self.stats["saves"] += 1
+
+    async def _save_summary(self, session: Session):
+        key, _ = self._keys(session.session_id)
+
+        def queue(pipe):
+            pipe.hset(key, "summary", session.summary)
+            # The session may have expired meanwhile; don't leave a key without a TTL behind
+            pipe.expire(key, self.idle_ttl)
+
+        await self._trim(session, queue)
+        self.stats["summary_saves"] += 1
+
+    async def _trim(self, session: Session, queue_writes):
+        """Queue `queue_writes(pipe)` in a transaction that also drops pending turns before session.pending_base."""
+        key, pending_key = self._keys(session.session_id)
+        target = session.pending_base
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key, pending_key)
+                    base = int(await pipe.hget(key, "pending_base") or 0)
+                    pipe.multi()
+                    queue_writes(pipe)
+                    if target > base:
+                        pipe.ltrim(pending_key, target - base, -1)
+                        pipe.hset(key, "pending_base", target)
+                        self.stats["trims"] += 1
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    # Another worker changed the session between the read and the write
+                    self.stats["conflicts"] += 1
+        self._stored_base[session] = max(target, self._stored_base.get(session, 0))
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, "idle_ttl": self.idle_ttl, "timeout": self.timeout, **self.stats}
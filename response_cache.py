@@ -0,0 +1,67 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace."""
+    text = _PUNCTUATION.sub("", message.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """Short hash identifying the prompt configuration (system instruction, model) a reply came from."""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Exact-match LRU + TTL cache of first-turn replies keyed by the normalized message.
+
+    Replies only depend on the message when there is no prior history, so callers
+    must only consult it for first-turn requests.
+    """
+
+    def __init__(self, fingerprint: str, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def key(self, message: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}\0{normalize_message(message)}".encode("utf-8")).hexdigest()
+
+    def get(self, message: str) -> Optional[str]:
+        key = self.key(message)
+        entry = self.entries.get(key)
+        if entry is not None:
+            reply, expires_at = entry
+            if expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return reply
+            del self.entries[key]
+            self.stats["expirations"] += 1
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, message: str, reply: str):
+        key = self.key(message)
+        self.entries[key] = (reply, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "size": len(self.entries),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            **self.stats,
+        }
@@ -0,0 +1,113 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+
+def is_overload(e: Exception) -> bool:
+    """True for quota / rate-limit errors (HTTP 429, gRPC RESOURCE_EXHAUSTED)."""
+    # ResourceExhausted is a subclass; the error text is never matched, it may mention "429" for other reasons
+    return isinstance(e, api_exceptions.TooManyRequests)
+
+
+def is_retryable(e: Exception) -> bool:
+    """Transient Gemini errors worth another attempt: overload, attempt timeouts and 5xx other than 501."""
+    if isinstance(e, api_exceptions.NotImplemented):
+        return False
+    return isinstance(e, (api_exceptions.TooManyRequests, api_exceptions.ServerError, asyncio.TimeoutError))
+
+
+def retry_hint(e: Exception) -> Optional[float]:
+    """Server-suggested delay in seconds from a google.rpc.RetryInfo error detail, if any."""
+    for detail in getattr(e, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            try:
+                return float(str(detail["retryDelay"]).rstrip("s"))
+            except ValueError:
+                continue
+    return None
+
+
+class RetryBudget:
+    """Caps retries at a fraction of first attempts so retries cannot amplify an overload.
+
+    Every first attempt deposits `ratio` tokens (up to `max_tokens`) and every retry
+    spends one, so over time at most `ratio` extra calls are made per call.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def record_call(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class RetryPolicy:
+    """Retries transient errors with full-jitter exponential backoff.
+
+    The delay is at least the server's retry hint, and a retry is only attempted
+    if it can start before `deadline` and the shared budget allows it.
+    """
+
+    def __init__(self, budget: RetryBudget, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, max_elapsed: float = 30.0):
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.stats = {"calls": 0, "retries": 0, "budget_exhausted": 0, "deadline_exhausted": 0,
+                      "attempts_exhausted": 0}
+
+    def backoff(self, attempt: int, e: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        hint = retry_hint(e)
+        return max(delay, hint) if hint is not None else delay
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """Run `fn` until it succeeds or retrying is no longer allowed.
+
+        `deadline` is an absolute time.monotonic() value; it defaults to max_elapsed from now.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.max_elapsed
+        self.stats["calls"] += 1
+        self.budget.record_call()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= self.max_attempts:
+                    self.stats["attempts_exhausted"] += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    self.stats["deadline_exhausted"] += 1
+                    raise
+                if not self.budget.try_spend():
+                    self.stats["budget_exhausted"] += 1
+                    raise
+                self.stats["retries"] += 1
+                print(f"Retrying Gemini call in {delay:.2f}s after: {e}")
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> dict:
+        return {"budget_tokens": round(self.budget.tokens, 2), **self.stats}
@@ -0,0 +1,120 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+import deadline
+from response_cache import normalize_message
+
+POLICIES = ("queue", "reject", "merge")
+
+
+class SessionBusy(Exception):
+    """Another turn for the session is still in flight (and could not be queued or merged)."""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} already has a turn in flight")
+        self.session_id = session_id
+
+
+class _SessionTurns:
+    __slots__ = ("lock", "message", "result", "__weakref__")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.message: Optional[str] = None  # normalized message of the turn in flight
+        self.result: Optional[asyncio.Future] = None
+
+
+class TurnSlot:
+    """A request's place in its session's turn order.
+
+    Either the request owns the turn (and reports its outcome with
+    `set_result`) or it was merged into an identical turn already in flight
+    (`merged`), whose outcome `shared_result` returns.
+    """
+
+    __slots__ = ("_future", "merged")
+
+    def __init__(self, future: asyncio.Future, merged: bool):
+        self._future = future
+        self.merged = merged
+
+    def set_result(self, result: Any):
+        if not self._future.done():
+            self._future.set_result(result)
+
+    async def shared_result(self) -> Any:
+        # Shielded so that one merged client going away doesn't cancel the others' result
+        return await asyncio.shield(self._future)
+
+
+def _consume(future: asyncio.Future):
+    # Nobody may have merged into the turn; don't warn about an unretrieved exception
+    if not future.cancelled():
+        future.exception()
+
+
+class SessionLocks:
+    """Serializes turns per session_id, so concurrent turns never read the same stale history.
+
+    A second request arriving while a turn is in flight is handled by `policy`:
+    "queue" waits for the lock (within the request deadline), "reject" raises
+    SessionBusy, and "merge" lets an identical message (a double submit) share
+    the in-flight turn's result while different messages queue. Locks live in a
+    WeakValueDictionary, so a session's entry disappears once no request holds it.
+    """
+
+    def __init__(self, policy: str = "queue"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown session turn policy: {policy}")
+        self.policy = policy
+        self.sessions: "weakref.WeakValueDictionary[str, _SessionTurns]" = weakref.WeakValueDictionary()
+        self.stats = {"turns": 0, "queued": 0, "rejected": 0, "merged": 0}
+
+    def _turns(self, session_id: str) -> _SessionTurns:
+        turns = self.sessions.get(session_id)
+        if turns is None:
+            turns = self.sessions[session_id] = _SessionTurns()
+        return turns
+
+    @asynccontextmanager
+    async def hold(self, session_id: str, message: str):
+        """Hold the session for one turn; yields a TurnSlot."""
+        turns = self._turns(session_id)
+        key = normalize_message(message)
+
+        if self.policy == "merge" and turns.result is not None and turns.message == key:
+            self.stats["merged"] += 1
+            yield TurnSlot(turns.result, merged=True)
+            return
+
+        if not turns.lock.locked():
+            # Uncontended: taken right away, before any other request can look at it
+            await turns.lock.acquire()
+        elif self.policy == "reject":
+            self.stats["rejected"] += 1
+            raise SessionBusy(session_id)
+        else:
+            self.stats["queued"] += 1
+            await deadline.within("session_lock", lambda timeout: turns.lock.acquire())
+
+        result = asyncio.get_running_loop().create_future()
+        result.add_done_callback(_consume)
+        turns.message, turns.result = key, result
+        self.stats["turns"] += 1
+        try:
+            yield TurnSlot(result, merged=False)
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+            raise
+        finally:
+            if not result.done():
+                # Abandoned (e.g. the client went away) without a result to share
+                result.set_exception(SessionBusy(session_id))
+            turns.message = turns.result = None
+            turns.lock.release()
+
+    def snapshot(self) -> dict:
+        return {"policy": self.policy, "active_sessions": len(self.sessions), **self.stats}
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from leads import LeadState
+from turns import TurnBuffer
+
+# Rough per-message cost beyond the text itself: a Turn (slots object, str
+# header) for the history, a dict, parts list and str header for pending turns
+TURN_OVERHEAD_BYTES = 120
+MESSAGE_OVERHEAD_BYTES = 400
+SESSION_OVERHEAD_BYTES = 1000
+
+
+@dataclass(eq=False)
+class Session:
+    """Everything kept for one widget session."""
+
+    session_id: str
+    history: TurnBuffer = field(default_factory=TurnBuffer)  # kept turns
+    summary: str = ""  # rolling summary of turns trimmed from the history
+    pending: List[Dict] = field(default_factory=list)  # trimmed turns not summarized yet
+    pending_base: int = 0  # position of pending[0] among all turns ever trimmed, for trimming by position
+    lead: LeadState = field(default_factory=LeadState)
+    last_active: float = field(default_factory=time.monotonic)
+    size: int = SESSION_OVERHEAD_BYTES  # estimated bytes, refreshed by MemorySessionStore.touch
+
+
+def estimate_size(session: Session) -> int:
+    return (
+        SESSION_OVERHEAD_BYTES
+        + len(session.summary)
+        + TURN_OVERHEAD_BYTES * len(session.history) + session.history.chars
+        + sum(MESSAGE_OVERHEAD_BYTES + len(m["parts"][0]) for m in session.pending)
+    )
+
+
+# Compact wire format for messages: [["u", "text"], ["m", "text"], ...]
+_ROLE_CODES = {"user": "u", "model": "m"}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+def dump_message(message: Dict) -> list:
+    return [_ROLE_CODES[message["role"]], message["parts"][0]]
+
+
+def load_message(item: list) -> Dict:
+    return {"role": _CODE_ROLES[item[0]], "parts": [item[1]]}
+
+
+def dump_messages(messages: List[Dict]) -> str:
+    return json.dumps([dump_message(m) for m in messages], ensure_ascii=False, separators=(",", ":"))
+
+
+def load_messages(data: Optional[str]) -> List[Dict]:
+    return [load_message(item) for item in json.loads(data)] if data else []
+
+
+def dump_turns(turns: TurnBuffer) -> str:
+    return json.dumps([[_ROLE_CODES[t.role], t.text] for t in turns], ensure_ascii=False, separators=(",", ":"))
+
+
+def load_turns(data: Optional[str], capacity: int = 64) -> TurnBuffer:
+    # A history stored with a larger capacity keeps its most recent messages
+    turns = TurnBuffer(capacity)
+    for code, text in json.loads(data) if data else ():
+        turns.append(_CODE_ROLES[code], text)
+    return turns
+
+
+def dump_lead(lead: LeadState) -> str:
+    return json.dumps({k: v for k, v in asdict(lead).items() if v is not None}, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_lead(data: Optional[str]) -> LeadState:
+    return LeadState(**json.loads(data)) if data else LeadState()
+
+
+class SessionStore(ABC):
+    """Interface for where sessions live.
+
+    A request loads the session, works on the returned record and saves it
+    after the turn, passing the turns trimmed from its history so a shared
+    store can append them to the session's pending list rather than overwrite
+    it. The summarizer reports each summary with `save_summary`, naming how
+    many pending turns it folded in.
+    """
+
+    name = "base"
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Session:
+        """The session, created if it doesn't exist yet."""
+
+    @abstractmethod
+    async def save(self, session: Session, evicted: List[Dict]):
+        """Persist the session after a turn; `evicted` are the turns trimmed from its history."""
+
+    @abstractmethod
+    async def save_summary(self, session: Session, summarized: int):
+        """Persist a new summary that folded in the first `summarized` pending turns."""
+
+    def snapshot(self) -> dict:
+        return {"name": self.name}
+
+
+class MemorySessionStore(SessionStore):
+    """In-memory sessions with LRU eviction, an idle TTL and global caps.
+
+    Sessions are kept in least-recently-used order, so the janitor only has to
+    look at the front to find idle ones, and the caps (`max_sessions`,
+    `max_bytes` of estimated memory) evict from the front as well. Expiry runs
+    in `run_forever`, never on the request path.
+
+    Records are shared with their callers, so saving only refreshes the size
+    estimate. Sessions are local to the process.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_sessions: int = 10000, max_bytes: int = 256 * 1024 * 1024,
+                 idle_ttl: float = 3600, sweep_interval: float = 30, history_capacity: int = 64):
+        self.max_sessions = max_sessions
+        self.history_capacity = history_capacity  # messages kept per session before the oldest pair is evicted
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.bytes = 0
+        self.stats = {"created": 0, "evictions": 0, "expirations": 0}
+        self._janitor: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._janitor = asyncio.create_task(self.run_forever())
+
+    async def close(self):
+        if self._janitor:
+            self._janitor.cancel()
+
+    async def load(self, session_id: str) -> Session:
+        return self.get(session_id)
+
+    async def save(self, session: Session, evicted: List[Dict]):
+        # The summarizer already moved `evicted` onto session.pending
+        self.touch(session)
+
+    async def save_summary(self, session: Session, summarized: int):
+        self.touch(session)
+
+    def get(self, session_id: str) -> Session:
+        """The session (created if new), marked as most recently used."""
+        session = self.find(session_id)
+        if session is None:
+            session = self.add(Session(session_id, history=TurnBuffer(self.history_capacity)))
+            self.stats["created"] += 1
+        return session
+
+    def find(self, session_id: str) -> Optional[Session]:
+        """The session if it is held here, marked as most recently used."""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+            session.last_active = time.monotonic()
+        return session
+
+    def add(self, session: Session) -> Session:
+        """Hold `session` as the most recently used one (e.g. after loading it from elsewhere)."""
+        if session.session_id in self.sessions:
+            self._remove(session.session_id)
+        session.size = estimate_size(session)
+        session.last_active = time.monotonic()
+        self.sessions[session.session_id] = session
+        self.bytes += session.size
+        self._evict_over_capacity()
+        return session
+
+    def touch(self, session: Session):
+        """Refresh a session's size estimate after it changed."""
+        size = estimate_size(session)
+        if self.sessions.get(session.session_id) is session:
+            self.bytes += size - session.size
+        session.size = size
+        self._evict_over_capacity()
+
+    def _remove(self, session_id: str):
+        session = self.sessions.pop(session_id)
+        self.bytes -= session.size
+
+    def _evict_over_capacity(self):
+        # The most recent session is never evicted, even if it alone exceeds max_bytes
+        while len(self.sessions) > 1 and (len(self.sessions) > self.max_sessions or self.bytes > self.max_bytes):
+            self._remove(next(iter(self.sessions)))
+            self.stats["evictions"] += 1
+
+    def expire(self) -> int:
+        """Drop sessions idle for longer than the TTL; returns how many."""
+        cutoff = time.monotonic() - self.idle_ttl
+        expired = 0
+        for session in self.sessions.values():
+            if session.last_active > cutoff:
+                break
+            expired += 1
+        for _ in range(expired):
+            self._remove(next(iter(self.sessions)))
+        self.stats["expirations"] += expired
+        return expired
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.expire()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "size": len(self.sessions),
+            "estimated_bytes": self.bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            **self.stats,
+        }
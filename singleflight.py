@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one shared in-flight task.
+
+    The first caller for a key (the leader) starts the work as a separate task;
+    later callers with the same key await that task instead of starting their own.
+    Waiters are shielded from each other: cancelling the leader's request does not
+    cancel the shared work as long as someone else is still waiting for it. The
+    work is only cancelled once every waiter has gone away.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, _Call] = {}
+        self.stats = {"leaders": 0, "followers": 0, "abandoned": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self.calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self.calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self.stats["abandoned"] += 1
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
+        if not call.task.cancelled():
+            # Mark the exception as retrieved even if every waiter was cancelled
+            call.task.exception()
+
+    def snapshot(self) -> dict:
+        total = self.stats["leaders"] + self.stats["followers"]
+        return {
+            "in_flight": len(self.calls),
+            "coalescing_ratio": self.stats["followers"] / total if total else 0.0,
+            **self.stats,
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from session_store import (
+    MemorySessionStore, Session, SessionStore, dump_lead, dump_messages, dump_turns, load_lead, load_messages, load_turns,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    history TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    pending TEXT NOT NULL,
+    lead TEXT NOT NULL,
+    last_active REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+"""
+
+_UPSERT = """
+INSERT INTO sessions (session_id, history, summary, pending, lead, last_active)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_id) DO UPDATE SET
+    history = excluded.history,
+    summary = excluded.summary,
+    pending = excluded.pending,
+    lead = excluded.lead,
+    last_active = excluded.last_active
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions persisted in an embedded SQLite database (WAL mode), for single-node deployments.
+
+    Reads are served from a hot in-memory LRU (a MemorySessionStore) and only
+    go to the database on a miss. Saves just mark the session dirty. A
+    background flusher writes all dirty sessions in one transaction every
+    `flush_interval` seconds, so requests never wait on the disk. A crash loses
+    at most the last interval. Rows idle for longer than `retention` are
+    deleted by the same task, using the last_active index.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "sessions.db", hot: Optional[MemorySessionStore] = None,
+                 flush_interval: float = 0.2, retention: float = 30 * 86400, sweep_interval: float = 300):
+        self.path = path
+        self.hot = hot if hot is not None else MemorySessionStore()
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+        self.dirty: Dict[str, Session] = {}
+        # One connection for reads, one for the flusher; WAL lets them run concurrently
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._read_lock = asyncio.Lock()
+        # All writes run on this one thread, so flushes never overlap (even across shutdown)
+        self._write_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {"db_reads": 0, "db_hits": 0, "flushes": 0, "rows_written": 0,
+                      "flush_failures": 0, "expired_rows": 0, "last_flush_ms": 0.0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints and still survives an application crash
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _open(self):
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._reader = self._connect()
+
+    async def _on_writer(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._write_thread, fn, *args)
+
+    async def start(self):
+        await self._on_writer(self._open)
+        await self.hot.start()
+        self._flusher = asyncio.create_task(self.run_forever())
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+        await self.hot.close()
+        await self.flush()
+        if self._reader is not None:
+            self._reader.close()
+        if self._writer is not None:
+            await self._on_writer(self._writer.close)
+        self._write_thread.shutdown()
+
+    def _read(self, session_id: str):
+        return self._reader.execute(
+            "SELECT history, summary, pending, lead FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+    async def load(self, session_id: str) -> Session:
+        session = self.hot.find(session_id)
+        if session is not None:
+            return session
+        # Evicted from the hot set but not flushed yet
+        session = self.dirty.get(session_id)
+        if session is not None:
+            return self.hot.add(session)
+
+        async with self._read_lock:
+            row = await asyncio.to_thread(self._read, session_id)
+        self.stats["db_reads"] += 1
+
+        session = self.hot.find(session_id) or self.dirty.get(session_id)
+        if session is not None:
+            # Loaded by a concurrent request while we were reading
+            return self.hot.add(session)
+        if row is None:
+            return self.hot.get(session_id)
+
+        self.stats["db_hits"] += 1
+        history, summary, pending, lead = row
+        return self.hot.add(Session(
+            session_id,
+            history=load_turns(history, self.hot.history_capacity),
+            summary=summary,
+            pending=load_messages(pending),
+            lead=load_lead(lead),
+        ))
+
+    async def save(self, session: Session, evicted: List[Dict]):
+        self.hot.touch(session)
+        self.dirty[session.session_id] = session
+
+    async def save_summary(self, session: Session, summarized: int):
+        self.hot.touch(session)
+        self.dirty[session.session_id] = session
+
+    def _write(self, rows: List[tuple]):
+        with self._writer:
+            self._writer.execute("BEGIN")
+            self._writer.executemany(_UPSERT, rows)
+
+    async def flush(self):
+        """Write all dirty sessions in one transaction."""
+        if not self.dirty or self._writer is None:
+            return
+        batch, self.dirty = self.dirty, {}
+        now = time.time()
+        # Serialized here, on the event loop, so no request mutates a session mid-dump
+        rows = [
+            (s.session_id, dump_turns(s.history), s.summary, dump_messages(s.pending), dump_lead(s.lead), now)
+            for s in batch.values()
+        ]
+        started = time.perf_counter()
+        try:
+            await self._on_writer(self._write, rows)
+        except Exception as e:
+            self.stats["flush_failures"] += 1
+            print(f"Failed to flush {len(rows)} sessions to SQLite: {e}")
+            # Retried on the next flush, unless the session was saved again since
+            for session_id, session in batch.items():
+                self.dirty.setdefault(session_id, session)
+            return
+        self.stats["flushes"] += 1
+        self.stats["rows_written"] += len(rows)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _delete_expired(self, cutoff: float) -> int:
+        with self._writer:
+            self._writer.execute("BEGIN")
+            return self._writer.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,)).rowcount
+
+    async def run_forever(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                try:
+                    self.stats["expired_rows"] += await self._on_writer(self._delete_expired, time.time() - self.retention)
+                except Exception as e:
+                    print(f"Failed to delete expired sessions from SQLite: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "dirty": len(self.dirty),
+            "hot": self.hot.snapshot(),
+            **self.stats,
+        }
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# (previous summary, newly evicted messages) -> updated summary
+SummarizeFn = Callable[[str, List[Dict]], Awaitable[str]]
+# (session, number of pending messages folded into the new summary) -> persisted.
+# session.pending_base has already been advanced past them.
+SavedFn = Callable[[object, int], Awaitable[None]]
+# text -> estimated tokens
+EstimateFn = Callable[[str], int]
+
+SUMMARY_PREFIX = "Summary of our earlier conversation (for context): "
+SUMMARY_ACK = "Understood."
+
+
+class RollingSummarizer:
+    """Folds history evicted by trimming into a compact running summary per session.
+
+    Evicted messages are queued on the session (`pending`) and summarized by a
+    background worker, off the request path. Each run only sends the previous
+    summary plus the messages evicted since, so older turns are never
+    re-summarized. Until the worker catches up, the pending messages are
+    served verbatim by `context`, capped at `max_pending_tokens` (oldest pairs
+    are dropped beyond it) so they can be budgeted for in the prompt.
+    `on_summary` persists each new summary when sessions live outside the process.
+    """
+
+    def __init__(self, summarize: SummarizeFn, estimate: EstimateFn, max_pending_sessions: int = 1000,
+                 max_pending_tokens: int = 1000, on_summary: Optional[SavedFn] = None):
+        self.summarize = summarize
+        self.estimate = estimate
+        self.on_summary = on_summary
+        self.max_pending_tokens = max_pending_tokens
+        self.queued = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending_sessions)
+        self.stats = {"submitted": 0, "summarized": 0, "failures": 0, "dropped": 0}
+
+    def submit(self, session, evicted: List[Dict]):
+        if not evicted:
+            return
+        self.stats["submitted"] += 1
+        pending = session.pending
+        pending.extend(evicted)
+        # The worker is failing or far behind; don't let the prompt grow without bound
+        tokens = self.pending_tokens(session)
+        overflow = 0
+        while tokens > self.max_pending_tokens and overflow < len(pending):
+            # Whole user/model pairs, oldest first
+            for m in pending[overflow:overflow + 2]:
+                tokens -= self.estimate(m["parts"][0])
+            overflow += 2
+        if overflow:
+            del pending[:overflow]
+            session.pending_base += overflow
+            self.stats["dropped"] += overflow
+        if pending:
+            self._enqueue(session)
+
+    def pending_tokens(self, session) -> int:
+        return sum(self.estimate(m["parts"][0]) for m in session.pending)
+
+    def _enqueue(self, session):
+        if session in self.queued:
+            return
+        try:
+            self.queue.put_nowait(session)
+            self.queued.add(session)
+        except asyncio.QueueFull:
+            # Stays pending and is retried on the session's next eviction
+            print(f"Summarizer queue full, deferring session {session.session_id}")
+
+    def context(self, session) -> List[Dict]:
+        """Messages to prepend to the session history when prompting the model."""
+        messages = []
+        if session.summary:
+            messages.append({"role": "user", "parts": [SUMMARY_PREFIX + session.summary]})
+            messages.append({"role": "model", "parts": [SUMMARY_ACK]})
+        messages.extend(session.pending)
+        return messages
+
+    async def run_forever(self):
+        while True:
+            session = await self.queue.get()
+            self.queued.discard(session)
+            evicted = list(session.pending)
+            if not evicted:
+                continue
+            try:
+                summary = await self.summarize(session.summary, evicted)
+            except Exception as e:
+                # Still pending; retried with the session's next eviction
+                self.stats["failures"] += 1
+                print(f"Failed to summarize session {session.session_id}: {e}")
+                continue
+            session.summary = summary.strip()
+            self.stats["summarized"] += 1
+            # Turns evicted while the call was in flight stay pending for the next run. Matched
+            # by identity: some of the summarized turns may have been dropped meanwhile.
+            summarized_ids = {id(m) for m in evicted}
+            summarized = 0
+            while summarized < len(session.pending) and id(session.pending[summarized]) in summarized_ids:
+                summarized += 1
+            del session.pending[:summarized]
+            session.pending_base += summarized
+            if self.on_summary is not None:
+                try:
+                    await self.on_summary(session, summarized)
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    print(f"Failed to save summary for session {session.session_id}: {e}")
+            if session.pending:
+                self._enqueue(session)
+
+    def snapshot(self) -> dict:
+        return {"queue_length": self.queue.qsize(), **self.stats}
@@ -0,0 +1,138 @@
+"""RedisSessionStore against an in-process fake server (fakeredis).
+
+    python -m pytest -q test_redis_session_store.py
+"""
+import asyncio
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from redis_session_store import RedisSessionStore
+from summarizer import RollingSummarizer
+
+
+def _message(role: str, text: str) -> dict:
+    return {"role": role, "parts": [text]}
+
+
+def _pair(i: int) -> list:
+    return [_message("user", f"question {i}"), _message("model", f"answer {i}")]
+
+
+def _texts(messages) -> list:
+    return [m["parts"][0] for m in messages]
+
+
+def _store() -> RedisSessionStore:
+    return RedisSessionStore(client=fakeredis.aioredis.FakeRedis(decode_responses=True), idle_ttl=60)
+
+
+def test_round_trip():
+    async def run():
+        store = _store()
+        session = await store.load("s1")
+        session.history.append("user", "hi")
+        session.history.append("model", "hello")
+        session.lead.name = "Jane"
+        session.pending.extend(_pair(0))
+        await store.save(session, _pair(0))
+
+        loaded = await store.load("s1")
+        assert loaded.history.to_sdk() == [_message("user", "hi"), _message("model", "hello")]
+        assert loaded.lead.name == "Jane"
+        assert _texts(loaded.pending) == ["question 0", "answer 0"]
+        assert await store.client.ttl("chat:session:{s1}") > 0
+
+    asyncio.run(run())
+
+
+def test_summary_keeps_turns_trimmed_after_an_overflow():
+    """A summary must only remove the turns it folded in, even after turns were dropped meanwhile."""
+    async def run():
+        store = _store()
+        release = asyncio.Event()
+        calls = []
+
+        async def summarize(previous, evicted):
+            calls.append(evicted)
+            if len(calls) > 1:
+                await asyncio.Event().wait()  # later runs stay in flight
+            await release.wait()
+            return "summary of " + ", ".join(_texts(evicted))
+
+        # Room for two pairs of pending turns
+        summarizer = RollingSummarizer(summarize, len, max_pending_tokens=40, on_summary=store.save_summary)
+        worker = asyncio.create_task(summarizer.run_forever())
+
+        # Turn 1 trims pairs 0 and 1; the summarizer starts on them
+        first = await store.load("s1")
+        evicted = _pair(0) + _pair(1)
+        summarizer.submit(first, evicted)
+        await store.save(first, evicted)
+        await asyncio.sleep(0)
+
+        # Turn 2 (another worker's copy of the session) trims pair 2, which pushes pair 0 over the cap
+        second = await store.load("s1")
+        summarizer.submit(second, _pair(2))
+        await store.save(second, _pair(2))
+        loaded = await store.load("s1")
+        assert _texts(loaded.pending) == ["question 1", "answer 1", "question 2", "answer 2"]
+        assert loaded.pending_base == 2
+
+        # The summary of pairs 0 and 1 lands; pair 2 was never summarized and must stay
+        release.set()
+        for _ in range(100):
+            if summarizer.stats["summarized"]:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        worker.cancel()
+
+        loaded = await store.load("s1")
+        assert loaded.summary == "summary of question 0, answer 0, question 1, answer 1"
+        assert _texts(loaded.pending) == ["question 2", "answer 2"]
+        assert loaded.pending_base == 4
+
+    asyncio.run(run())
+
+
+def test_summary_does_not_cut_unsummarized_turns():
+    async def run():
+        store = _store()
+        session = await store.load("s1")
+        session.pending.extend(_pair(0))
+        await store.save(session, _pair(0))
+
+        # Pair 1 is appended (by another request) while pair 0 is being summarized
+        other = await store.load("s1")
+        other.pending.extend(_pair(1))
+        await store.save(other, _pair(1))
+
+        del session.pending[:2]
+        session.pending_base += 2
+        session.summary = "summary of pair 0"
+        await store.save_summary(session, 2)
+
+        loaded = await store.load("s1")
+        assert loaded.summary == "summary of pair 0"
+        assert _texts(loaded.pending) == ["question 1", "answer 1"]
+        assert loaded.pending_base == 2
+
+    asyncio.run(run())
+
+
+def test_hung_server_times_out():
+    async def run():
+        # Accepts connections but never answers
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        store = RedisSessionStore(f"redis://127.0.0.1:{port}/0", timeout=0.2)
+        started = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await store.load("s1")
+        assert time.monotonic() - started < 1
+        server.close()
+
+    asyncio.run(run())
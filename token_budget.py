@@ -0,0 +1,52 @@
+import math
+from typing import Dict, List
+
+from turns import TurnBuffer
+
+
+class TokenEstimator:
+    """Cheap local token estimate (characters / chars_per_token).
+
+    The ratio starts at a typical value for English text and is calibrated
+    against real token counts from Gemini (count_tokens at startup, then
+    usage_metadata on replies) with an exponential moving average.
+    """
+
+    def __init__(self, chars_per_token: float = 4.0, smoothing: float = 0.1):
+        self.chars_per_token = chars_per_token
+        self.smoothing = smoothing
+        self.calibrated = False
+
+    def estimate(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def observe(self, chars: int, tokens: int):
+        """Fold a measured (characters, tokens) pair into the ratio."""
+        if chars <= 0 or tokens <= 0:
+            return
+        ratio = chars / tokens
+        if not self.calibrated:
+            self.chars_per_token = ratio
+            self.calibrated = True
+        else:
+            self.chars_per_token += self.smoothing * (ratio - self.chars_per_token)
+
+
+def history_chars(history: List[Dict]) -> int:
+    return sum(len(m["parts"][0]) for m in history)
+
+
+def trim_turns(turns: TurnBuffer, budget: int, estimator: TokenEstimator) -> List[Dict]:
+    """Drop the oldest user/model pairs until the turns fit in `budget` tokens.
+
+    Uses the buffer's running character count, so it is O(1) per evicted
+    message instead of re-estimating the whole history. The most recent pair
+    is always kept, even if it alone exceeds the budget. Evicted messages come
+    back in the SDK format.
+    """
+    max_chars = budget * estimator.chars_per_token
+    evicted = []
+    while turns.chars > max_chars and len(turns) > 2:
+        evicted.append(turns.popleft().to_sdk())
+        evicted.append(turns.popleft().to_sdk())
+    return evicted
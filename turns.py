@@ -0,0 +1,86 @@
+from typing import Dict, Iterator, List, Optional
+
+
+class Turn:
+    """One message of a conversation, without the SDK's dict-plus-list wrapping."""
+
+    __slots__ = ("role", "text")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.text = text
+
+    def to_sdk(self) -> Dict:
+        return {"role": self.role, "parts": [self.text]}
+
+
+class TurnBuffer:
+    """Fixed-capacity ring buffer of a session's messages.
+
+    Appending to a full buffer overwrites the oldest message and returns it,
+    and trimming from the front is O(1) per message, so nothing is ever copied.
+    A running character count lets token-budget trimming skip re-measuring the
+    whole history. The SDK's history format is only built on demand.
+    """
+
+    __slots__ = ("_slots", "_start", "_len", "chars")
+
+    def __init__(self, capacity: int = 64):
+        if capacity < 2 or capacity % 2:
+            raise ValueError("capacity must be an even number of messages (user/model pairs)")
+        self._slots: List[Optional[Turn]] = [None] * capacity
+        self._start = 0
+        self._len = 0
+        self.chars = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._slots)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _ordered(self) -> List[Turn]:
+        end = self._start + self._len
+        if end <= len(self._slots):
+            return self._slots[self._start:end]
+        return self._slots[self._start:] + self._slots[:end - len(self._slots)]
+
+    def __iter__(self) -> Iterator[Turn]:
+        return iter(self._ordered())
+
+    def append(self, role: str, text: str) -> Optional[Turn]:
+        """Add a message; returns the oldest one if it had to make room for it."""
+        slots = self._slots
+        capacity = len(slots)
+        if self._len == capacity:
+            # Full: the new message takes the oldest one's slot
+            evicted = slots[self._start]
+            slots[self._start] = Turn(role, text)
+            self._start = (self._start + 1) % capacity
+            self.chars += len(text) - len(evicted.text)
+            return evicted
+        slots[(self._start + self._len) % capacity] = Turn(role, text)
+        self._len += 1
+        self.chars += len(text)
+        return None
+
+    def popleft(self) -> Turn:
+        if not self._len:
+            raise IndexError("pop from an empty TurnBuffer")
+        turn = self._slots[self._start]
+        self._slots[self._start] = None
+        self._start = (self._start + 1) % len(self._slots)
+        self._len -= 1
+        self.chars -= len(turn.text)
+        return turn
+
+    def to_sdk(self) -> List[Dict]:
+        """The messages in the SDK's history format ([{role, parts: [text]}])."""
+        return [{"role": turn.role, "parts": [turn.text]} for turn in self._ordered()]
+
+    def tail(self, count: int) -> List[Dict]:
+        """The last `count` messages in the SDK's format."""
+        capacity = len(self._slots)
+        first = self._len - min(count, self._len)
+        return [self._slots[(self._start + i) % capacity].to_sdk() for i in range(first, self._len)]